@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+bench_generators.py
+
+Scaling benchmark for the config generators:
+- range_builder.py: generate(), streaming both range files from the cached
+  Jinja2 environment
+- build_ludus_config.py (interactive): define_parent_domain()/define_child_domain()
+  driven by scripted prompt answers, then the YAML dump
+- build_ludus_config.py (--spec): expand_spec() + YAML dump
+
+Prompts and `ludus` calls are stubbed; each scenario runs on synthetic
+forests of 10/100/1000 VMs and records best-of-N wall time and peak
+traced memory. Results can be saved as a baseline and later runs are
+compared against it.
+
+Usage:
+    python3 benchmarks/bench_generators.py [--sizes 10 100 1000] [--save-baseline]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines.json")
+
+# VMs per synthetic child domain (1 DC + members); keeps member octets valid.
+CHILD_SIZE = 50
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.pop(0)
+    return module
+
+range_builder = load_module("range_builder", os.path.join(ROOT, "scripts", "range_builder.py"))
+build_ludus_config = load_module("build_ludus_config", os.path.join(ROOT, "python scripts", "build_ludus_config.py"))
+
+# --------------------------------------------------------------------------
+# Stubs
+# --------------------------------------------------------------------------
+
+class Answers:
+    """Replays scripted prompt answers; running out means the prompts changed."""
+
+    def __init__(self, answers):
+        self.answers = iter(answers)
+
+    def __call__(self, prompt=""):
+        try:
+            return next(self.answers)
+        except StopIteration:
+            raise RuntimeError(f"benchmark ran out of scripted answers at prompt: {prompt!r}")
+
+def child_sizes(n_vms):
+    """Split n_vms - 1 (the parent DC) into child domains of at most CHILD_SIZE VMs."""
+    remaining, sizes = n_vms - 1, []
+    while remaining > 0:
+        sizes.append(min(CHILD_SIZE, remaining))
+        remaining -= sizes[-1]
+    return sizes
+
+# --------------------------------------------------------------------------
+# Scenarios
+# --------------------------------------------------------------------------
+
+def synthetic_vms(n_vms):
+    vms = []
+    for c, size in enumerate(child_sizes(n_vms) or [0]):
+        vlan = 20 + c
+        for i in range(size):
+            depends = [{"vm_name": f"CHILD{c}-DC1", "role": "ludus_create_child_domain"}] if i else []
+            vms.append(range_builder.VM(
+                f"CHILD{c}-VM{i}", f"CHILD{c}-VM{i}", "win2022-server-x64-template", vlan, 10 + i, 2, 4,
+                domain={"fqdn": f"child{c}.ershon.local", "role": "member"},
+                roles=[{"name": "ludus_join_child_domain", "depends_on": depends,
+                        "vars": {"dc_ip": f"10.2.{vlan}.10"}}]))
+    return vms[:max(n_vms, 1)]
+
+def bench_range_builder(n_vms, workdir):
+    range_builder.generate(os.path.join(workdir, "range_build.yml"), os.path.join(workdir, "range_segmented.yml"),
+                           synthetic_vms(n_vms), clone_type="linked", disable_defender=True,
+                           global_role_vars={"ad_domain_admin": "domainadmin"})
+
+def interactive_answers(n_vms):
+    answers = ["MH"] + [""] * 6           # range id, global defaults
+    answers += [""] * 8 + ["n"]           # parent domain + PDC, no secondary
+    for c, size in enumerate(child_sizes(n_vms)):
+        answers += ["y", f"child{c}", "", str(20 + c)]   # add child, name, netbios, vlan
+        answers += [""] * 5 + ["n"]                      # PDC, no secondary
+        answers += ["n", str(size - 1)]                  # no bulk stamping, member count
+        for _ in range(size - 1):
+            answers += ["", "n", "", "", ""]             # hostname, workstation, octet, ram, cpus
+    answers += ["n"]
+    return answers
+
+def bench_interactive(n_vms, workdir):
+    blc = build_ludus_config
+    blc.input = Answers(interactive_answers(n_vms))
+    try:
+        range_id = blc.get_input("Enter your Ludus Range ID (e.g., MH)", "MH")
+        config = {'defaults': blc.get_default_settings(), 'network': {}, 'ludus': []}
+        allocator = blc.IPAllocator()
+        parent_vms, fqdn, netbios, parent_dc_info = blc.define_parent_domain(range_id, allocator)
+        config['ludus'].extend(parent_vms)
+        while blc.get_yes_no("Add a child domain?"):
+            config['ludus'].extend(blc.define_child_domain(range_id, fqdn, netbios, parent_dc_info, allocator))
+    finally:
+        del blc.input
+    blc.write_config(config, os.path.join(workdir, "interactive.yml"))
+
+def bench_spec(n_vms, workdir):
+    spec = {
+        'forest': {'fqdn': "ershon.local"},
+        'children': [{'name': f"child{c}", 'workstations': size - 1}
+                     for c, size in enumerate(child_sizes(n_vms))],
+    }
+    config = build_ludus_config.expand_spec(spec)
+    build_ludus_config.write_config(config, os.path.join(workdir, "spec.yml"))
+
+SCENARIOS = {
+    "range_builder.render": bench_range_builder,
+    "build_ludus_config.interactive": bench_interactive,
+    "build_ludus_config.spec": bench_spec,
+}
+
+# --------------------------------------------------------------------------
+# Runner
+# --------------------------------------------------------------------------
+
+def measure(func, n_vms, repeat):
+    """Best-of-`repeat` wall time, then one traced run for peak memory."""
+    with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(n_vms, workdir)
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        func(n_vms, workdir)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"seconds": round(best, 5), "peak_kb": round(peak / 1024, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Ludus config generators.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", choices=sorted(SCENARIOS), action="append", help="Run only this scenario")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help=f"Baseline file (default: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown/growth over baseline before flagging (default 0.5 = +50%%)")
+    args = parser.parse_args()
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    results, regressions = {}, []
+    print(f"{'SCENARIO':<34} {'VMs':>5} {'seconds':>10} {'peak KB':>10}  vs baseline")
+    for name in args.only or SCENARIOS:
+        for size in args.sizes:
+            result = measure(SCENARIOS[name], size, args.repeat)
+            results.setdefault(name, {})[str(size)] = result
+            note = ""
+            base = baseline.get(name, {}).get(str(size))
+            if base:
+                time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1
+                mem_ratio = result["peak_kb"] / base["peak_kb"] if base["peak_kb"] else 1
+                note = f"x{time_ratio:.2f} time, x{mem_ratio:.2f} mem"
+                if time_ratio > 1 + args.tolerance or mem_ratio > 1 + args.tolerance:
+                    regressions.append(f"{name} @ {size}")
+                    note += "  ← REGRESSION"
+            print(f"{name:<34} {size:>5} {result['seconds']:>10.4f} {result['peak_kb']:>10.1f}  {note}")
+
+    if args.save_baseline:
+        for name, sizes in results.items():
+            baseline.setdefault(name, {}).update(sizes)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    if regressions:
+        print(f"\nRegressions: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# =======================================================================
+# File: callback_plugins/ludus_forest_timing.py
+# Description: Ansible callback that writes one JSON line per task and
+#              host for the ludus_* forest build roles, so deploys can be
+#              tuned from measurements (see scripts/timing_report.py).
+# =======================================================================
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: ludus_forest_timing
+    type: aggregate
+    short_description: Per-task timing records for the ludus forest build roles
+    description:
+      - Appends one JSON object per task result (host, role, task, start, end,
+        duration, status, retries) to a JSON Lines file.
+      - Only tasks from roles whose name starts with one of the configured
+        prefixes are recorded.
+    requirements:
+      - enable in ansible.cfg (callbacks_enabled) or ANSIBLE_CALLBACKS_ENABLED
+    options:
+      log_path:
+        description: JSON Lines file the records are appended to.
+        default: ~/.ansible/ludus_forest_timing.jsonl
+        env:
+          - name: LUDUS_TIMING_LOG
+        ini:
+          - section: callback_ludus_forest_timing
+            key: log_path
+      role_prefixes:
+        description: Comma separated role name prefixes to record; '*' records every task.
+        default: ludus_
+        env:
+          - name: LUDUS_TIMING_ROLES
+        ini:
+          - section: callback_ludus_forest_timing
+            key: role_prefixes
+'''
+
+import os
+import json
+import time
+import uuid
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'ludus_forest_timing'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.task_started = {}    # task uuid -> time the task started
+        self.host_started = {}    # (task uuid, host) -> time the host started it
+        self.retries = {}         # (task uuid, host) -> retry count
+        self.log_path = None
+        self.prefixes = None
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.log_path = os.path.expanduser(self.get_option('log_path'))
+        self.prefixes = [p.strip() for p in self.get_option('role_prefixes').split(',') if p.strip()]
+
+    def _role_of(self, task):
+        role = getattr(task, '_role', None)
+        return role.get_name() if role else None
+
+    def _wanted(self, task):
+        if '*' in self.prefixes:
+            return True
+        role = self._role_of(task)
+        return bool(role) and any(role.startswith(p) for p in self.prefixes)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        if self._wanted(task):
+            self.task_started[task._uuid] = time.time()
+
+    def v2_runner_on_start(self, host, task):
+        if self._wanted(task):
+            self.host_started[(task._uuid, host.get_name())] = time.time()
+
+    def v2_runner_retry(self, result):
+        key = (result._task._uuid, result._host.get_name())
+        self.retries[key] = self.retries.get(key, 0) + 1
+
+    def _record(self, result, status):
+        task = result._task
+        if not self._wanted(task):
+            return
+        host = result._host.get_name()
+        key = (task._uuid, host)
+        end = time.time()
+        start = self.host_started.pop(key, self.task_started.get(task._uuid, end))
+        role = self._role_of(task)
+        name = task.get_name()
+        if role and name.startswith(role + ' : '):
+            name = name[len(role) + 3:]
+        record = {
+            'run_id': self.run_id,
+            'host': host,
+            'role': role,
+            'task': name,
+            'start': round(start, 3),
+            'end': round(end, 3),
+            'duration': round(end - start, 3),
+            'status': status,
+            'retries': self.retries.pop(key, 0) or max(0, result._result.get('attempts', 1) - 1),
+        }
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except (IOError, OSError) as e:
+            self._display.warning('ludus_forest_timing: cannot write %s: %s' % (self.log_path, e))
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'changed' if result._result.get('changed') else 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
@@ -2,6 +2,10 @@
 
 # This script clones the ludus_forest_build_roles repository and automatically
 # finds and installs all Ansible roles contained within it for the current Ludus user.
+#
+# Roles whose content hash matches what was last pushed for this Ludus
+# server/user are skipped; the rest are uploaded concurrently
+# (LUDUS_ROLE_SYNC_JOBS at a time, default 4).
 
 # Exit immediately if a command exits with a non-zero status.
 set -e
@@ -9,6 +13,37 @@ set -e
 # Define the repository URL
 REPO_URL="https://github.com/H4cksty/ludus_forest_build_roles.git"
 REPO_DIR="ludus_forest_build_roles"
+MAX_JOBS="${LUDUS_ROLE_SYNC_JOBS:-4}"
+
+# Hashes of pushed roles, shared with scripts/depricated_ludus_forest_builder.py.
+# The file is keyed by Ludus server URL and user like scripts/ludus_cache.py.
+CACHE_DIR="${XDG_CACHE_HOME:-$HOME/.cache}/ludus_forest_build_roles"
+LUDUS_SERVER="${LUDUS_URL:-$(sed -n 's/^url:[[:space:]]*//p' "$HOME/.config/ludus/config.yml" 2>/dev/null | tr -d "\"'")}"
+LUDUS_SERVER="${LUDUS_SERVER%/}"
+if [[ "$LUDUS_API_KEY" == *.* ]]; then
+  LUDUS_USER="${LUDUS_API_KEY%%.*}"
+else
+  LUDUS_USER="${LOGNAME:-${USER:-$(id -un)}}"
+fi
+STATE_KEY="$(printf '%s|%s' "$LUDUS_SERVER" "$LUDUS_USER" | sha256sum | cut -c1-16)"
+STATE_FILE="$CACHE_DIR/installed-roles-$STATE_KEY.sha256"
+
+# Same digest as role_content_hash() in the Python builder.
+role_hash() {
+  (cd "$1" && find . -type f -print0 | LC_ALL=C sort -z | xargs -0 -r sha256sum | sha256sum | cut -d' ' -f1)
+}
+
+# Uploads one role and records "<status> <seconds> <hash>" for the summary.
+push_role() {
+  local role="$1" hash="$2" flag="$3" start status
+  start=$(date +%s.%N)
+  if ludus ansible role add -d "./$role" $flag > "$WORK_DIR/$role.log" 2>&1; then
+    status=ok
+  else
+    status=FAILED
+  fi
+  echo "$status $(awk -v s="$start" -v e="$(date +%s.%N)" 'BEGIN { printf "%.1f", e - s }') $hash" > "$WORK_DIR/$role.result"
+}
 
 # Clone the repository
 echo "Cloning repository..."
@@ -17,13 +52,54 @@ git clone "$REPO_URL"
 # Navigate into the repository directory
 cd "$REPO_DIR"
 
-# Find all directories prefixed with "ludus_" and add them as roles
+WORK_DIR="$(mktemp -d)"
+trap 'rm -rf "$WORK_DIR"' EXIT
+mkdir -p "$CACHE_DIR"
+touch "$STATE_FILE"
+
+INSTALLED="$(ludus ansible role list | grep ludus_ | awk '{print $2}' || true)"
+
+# Find all directories prefixed with "ludus_" and add the changed ones as roles
 echo "Adding Ansible roles to Ludus..."
 for d in ludus_*; do
   if [ -d "$d" ]; then
+    hash="$(role_hash "$d")"
+    flag=""
+    if grep -qx "$d" <<< "$INSTALLED"; then
+      if grep -qx "$hash  $d" "$STATE_FILE"; then
+        echo "Up to date: $d"
+        continue
+      fi
+      flag="--force"
+    fi
+    while [ "$(jobs -rp | wc -l)" -ge "$MAX_JOBS" ]; do
+      wait -n || true
+    done
     echo "Adding role: $d"
-    ludus ansible role add -d "./$d"
+    push_role "$d" "$hash" "$flag" &
   fi
 done
+wait
+
+failed=0
+for result in "$WORK_DIR"/*.result; do
+  [ -e "$result" ] || continue
+  role="$(basename "$result" .result)"
+  read -r status seconds hash < "$result"
+  printf '  %-28s %-7s %6.1fs\n' "$role" "$status" "$seconds"
+  if [ "$status" = ok ]; then
+    grep -v "  $role\$" "$STATE_FILE" > "$STATE_FILE.tmp" || true
+    echo "$hash  $role" >> "$STATE_FILE.tmp"
+    mv "$STATE_FILE.tmp" "$STATE_FILE"
+  else
+    failed=1
+    sed 's/^/    /' "$WORK_DIR/$role.log" >&2
+  fi
+done
+
+if [ "$failed" -ne 0 ]; then
+  echo "Some roles failed to install." >&2
+  exit 1
+fi
 
 echo "All roles have been successfully installed."
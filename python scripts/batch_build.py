@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+"""
+Batch generator: one topology spec, many ranges (classroom/tenant fan-out).
+
+Each tenant's config is expand_spec() of the shared spec with that tenant's
+overrides deep-merged on top. Configs are rendered in parallel in a process
+pool, written atomically to <out>/<range_id>/ludus-config.yml, and listed in
+<out>/manifest.json. With --push every config is applied with
+`ludus range config set` through a small bounded pool of workers.
+
+Usage:
+    ./batch_build.py --spec forest.yml --ranges STU01 STU02 STU03 [--out batch] [--push]
+    ./batch_build.py --spec forest.yml --tenants tenants.yml [--workers 8] [--push --push-workers 4]
+
+tenants.yml:
+    tenants:
+      - STU01
+      - range_id: STU02
+        user_id: JD            # Ludus user to push to (default: the range ID)
+        overrides: {defaults: {ad_domain_admin_password: "S3cret!"}}
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import yaml
+
+from build_ludus_config import load_spec, expand_spec, write_config
+
+DEFAULT_PUSH_WORKERS = 4
+CONFIG_NAME = "ludus-config.yml"
+
+# --- Tenants ---
+
+def deep_merge(base, override):
+    """Recursively merges dicts; any other value in `override` replaces the base value."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def make_tenant(range_id, user_id=None, overrides=None):
+    """A tenant entry; the Ludus user ID defaults to the range ID."""
+    return {'range_id': str(range_id), 'user_id': str(user_id or range_id), 'overrides': overrides or {}}
+
+def load_tenants(path):
+    """Reads a tenants file into [{'range_id': ..., 'user_id': ..., 'overrides': {...}}]."""
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    entries = data.get('tenants') if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a 'tenants' list")
+    tenants = []
+    for n, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {'range_id': entry}
+        if not isinstance(entry, dict) or not entry.get('range_id'):
+            raise ValueError(f"{path}: tenants[{n}] needs a range_id")
+        tenants.append(make_tenant(entry['range_id'], entry.get('user_id'), entry.get('overrides')))
+    return tenants
+
+# --- Rendering (runs in worker processes) ---
+
+def render_tenant(spec, tenant, out_dir):
+    """Expands and writes one tenant's config atomically; returns its manifest entry."""
+    started = time.perf_counter()
+    range_id = tenant['range_id']
+    tenant_dir = os.path.join(out_dir, range_id)
+    path = os.path.join(tenant_dir, CONFIG_NAME)
+    entry = {'range_id': range_id, 'user_id': tenant['user_id'], 'path': path}
+    try:
+        config = expand_spec(deep_merge(spec, tenant['overrides']))
+        os.makedirs(tenant_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        write_config(config, tmp_path, spec.get('yaml_anchors', False))
+        with open(tmp_path, 'rb') as f:
+            entry['sha256'] = hashlib.sha256(f.read()).hexdigest()
+        os.replace(tmp_path, path)
+        entry.update({'status': 'rendered', 'vms': len(config['ludus'])})
+    except Exception as e:
+        # A malformed override must fail only its own tenant, not the pool.
+        entry.update({'status': 'failed', 'error': f"{type(e).__name__}: {e}"})
+    entry['render_seconds'] = round(time.perf_counter() - started, 3)
+    return entry
+
+# --- Pushing ---
+
+def push_config(entry):
+    """Applies one rendered config to its tenant's range with `ludus range config set`."""
+    command = ["ludus", "range", "config", "set", "-f", entry['path'], "--user", entry['user_id']]
+    started = time.perf_counter()
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
+        entry['push'] = 'ok'
+    except subprocess.CalledProcessError as e:
+        entry['push'] = 'failed'
+        entry['push_error'] = (e.stderr or e.stdout or '').strip()
+    except FileNotFoundError:
+        entry['push'] = 'failed'
+        entry['push_error'] = "ludus CLI not found"
+    entry['push_seconds'] = round(time.perf_counter() - started, 3)
+    return entry
+
+def write_manifest(out_dir, manifest):
+    """Writes manifest.json atomically."""
+    path = os.path.join(out_dir, "manifest.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+# --- Main Execution ---
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render one topology spec for many ranges in parallel.")
+    parser.add_argument("--spec", required=True, help="Topology spec (YAML), same format as build_ludus_config.py --spec")
+    tenants = parser.add_mutually_exclusive_group(required=True)
+    tenants.add_argument("--ranges", nargs="+", help="Range IDs to generate")
+    tenants.add_argument("--tenants", help="YAML list of range IDs with optional per-tenant overrides")
+    parser.add_argument("--out", default="batch-output", help="Output directory (default: batch-output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Render processes (default: CPU count)")
+    parser.add_argument("--push", action="store_true", help="Apply each config with `ludus range config set`")
+    parser.add_argument("--push-workers", type=int, default=DEFAULT_PUSH_WORKERS,
+                        help=f"Concurrent pushes (default: {DEFAULT_PUSH_WORKERS})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    try:
+        spec = load_spec(args.spec)
+        tenants = load_tenants(args.tenants) if args.tenants else [make_tenant(r) for r in args.ranges]
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    range_ids = [t['range_id'] for t in tenants]
+    duplicates = sorted({r for r in range_ids if range_ids.count(r) > 1})
+    if duplicates:
+        print(f"Error: duplicate range IDs: {', '.join(duplicates)}", file=sys.stderr)
+        sys.exit(1)
+
+    os.makedirs(args.out, exist_ok=True)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        entries = list(pool.map(render_tenant, [spec] * len(tenants), tenants, [args.out] * len(tenants)))
+    render_seconds = time.perf_counter() - started
+    rendered = [e for e in entries if e['status'] == 'rendered']
+    print(f"Rendered {len(rendered)}/{len(entries)} configs into {args.out} in {render_seconds:.2f}s")
+
+    push_seconds = None
+    if args.push and rendered:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.push_workers)) as pool:
+            for entry in pool.map(push_config, rendered):
+                mark = "✓" if entry['push'] == 'ok' else "✗"
+                print(f"  {mark} {entry['range_id']} ({entry['push_seconds']:.1f}s)")
+        push_seconds = time.perf_counter() - started
+        print(f"Pushed {sum(e['push'] == 'ok' for e in rendered)}/{len(rendered)} configs in {push_seconds:.2f}s")
+
+    manifest = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'spec': os.path.abspath(args.spec),
+        'render_seconds': round(render_seconds, 3),
+        'push_seconds': round(push_seconds, 3) if push_seconds is not None else None,
+        'tenants': entries
+    }
+    print(f"Manifest: {write_manifest(args.out, manifest)}")
+
+    failed = [e for e in entries if e['status'] != 'rendered' or e.get('push') == 'failed']
+    for entry in failed:
+        print(f"✗ {entry['range_id']}: {entry.get('error') or entry.get('push_error')}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
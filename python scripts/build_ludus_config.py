@@ -1,7 +1,15 @@
 #!/usr/bin/python3
 
 import yaml         # requires python pip3 install pyyaml (likely already installed)
+import os
 import sys
+import json
+import argparse
+
+# Shared helpers (IP allocator, ...) live in ../scripts.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "scripts"))
+from ip_allocator import IPAllocator, AllocationError
+from capacity_plan import HOST_FROM_ENV, plan, print_plan, apply_clone_recommendations
 
 # --- Helper Functions for User Input ---
 
@@ -43,6 +51,182 @@ def get_yes_no(prompt, default='n'):
             return False
         print("Invalid input. Please enter 'y' or 'n'.", file=sys.stderr)
 
+def get_octet_input(prompt, allocator, vlan, role, owner):
+    """Prompts for a last octet (default: next free one for the role) and claims it, re-prompting on collisions."""
+    while True:
+        octet = get_int_input(prompt, allocator.next_free(vlan, role))
+        try:
+            return allocator.claim(vlan, octet, owner)
+        except AllocationError as e:
+            print(f"{e}. Please choose another.", file=sys.stderr)
+
+def prestaged_template(template, prestaged=True):
+    """win2019-server-x64-template -> win2019-server-x64-adds-template (built with the ludus_prestage_adds role)."""
+    if not prestaged or "-adds-" in template or not template.endswith("-template"):
+        return template
+    return template[:-len("-template")] + "-adds-template"
+
+def prompt_sizing(template, ram_gb, cpus):
+    """Prompts for template, RAM and CPUs (in that order) and returns a sizing dict."""
+    return {
+        'template': get_input("Template", template),
+        'ram_gb': get_int_input("RAM (GB)", ram_gb),
+        'cpus': get_int_input("CPUs", cpus)
+    }
+
+# --- VM Definitions ---
+# Shared by the interactive prompts and the headless --spec mode so both
+# produce exactly the same ludus entries.
+
+def base_vm(hostname, vlan, octet, sizing):
+    """Returns the common fields every ludus VM entry starts with."""
+    return {
+        'vm_name': f"{{{{ range_id }}}}-{hostname}",
+        'hostname': hostname,
+        'template': sizing['template'],
+        'vlan': vlan,
+        'ip_last_octet': octet,
+        'ram_gb': sizing['ram_gb'],
+        'cpus': sizing['cpus']
+    }
+
+def parent_pdc_vm(hostname, vlan, octet, sizing, fqdn):
+    """Parent domain primary DC, marked as the ludus_verify_dc_ready target."""
+    vm = base_vm(hostname, vlan, octet, sizing)
+    vm['domain'] = {'fqdn': fqdn, 'role': 'primary-dc'}
+    vm['windows'] = {'sysprep': True, 'gpos': ['disable_defender']}
+    vm['roles'] = ['ludus_verify_dc_ready']
+    return vm
+
+def parent_sdc_vm(hostname, vlan, octet, sizing, fqdn):
+    """Parent domain secondary DC, promoted natively by Ludus."""
+    vm = base_vm(hostname, vlan, octet, sizing)
+    vm['windows'] = {'sysprep': True}
+    vm['domain'] = {'fqdn': fqdn, 'role': 'alt-dc'}
+    return vm
+
+def child_pdc_vm(hostname, vlan, octet, sizing, child_fqdn, parent_netbios, parent_dc_info):
+    """First DC of a child domain (ludus_create_child_domain)."""
+    vm = base_vm(hostname, vlan, octet, sizing)
+    vm['windows'] = {'sysprep': True}
+    vm['roles'] = [{
+        'name': 'ludus_create_child_domain',
+        'depends_on': [{'vm_name': f"{{{{ range_id }}}}-{parent_dc_info['hostname']}", 'role': 'ludus_verify_dc_ready'}]
+    }]
+    vm['role_vars'] = {
+        'new_child_fqdn': child_fqdn,
+        'parent_domain_netbios_name': parent_netbios,
+        'parent_dc_ip': f"10.2.{parent_dc_info['vlan']}.{parent_dc_info['octet']}"
+    }
+    return vm
+
+def child_sdc_vm(hostname, vlan, octet, sizing, child_fqdn, parent_netbios, pdc_vm, ifm=False):
+    """Replica DC in a child domain (ludus_secondary_child_dc), optionally seeded from IFM media of the PDC."""
+    vm = base_vm(hostname, vlan, octet, sizing)
+    vm['windows'] = {'sysprep': True}
+    vm['roles'] = [{
+        'name': 'ludus_secondary_child_dc',
+        'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]
+    }]
+    vm['role_vars'] = {
+        'dns_domain_name': child_fqdn,
+        'parent_domain_netbios_name': parent_netbios,
+        'existing_dc_ip': f"10.2.{pdc_vm['vlan']}.{pdc_vm['ip_last_octet']}"
+    }
+    if ifm:
+        vm['role_vars'].update({'ifm_enabled': True, 'ifm_source_host': pdc_vm['vm_name']})
+    return vm
+
+def child_member_vm(hostname, vlan, octet, sizing, child_fqdn, child_netbios, pdc_vm):
+    """Workstation or server joined to a child domain (ludus_prep_child_member + ludus_join_child_domain)."""
+    vm = base_vm(hostname, vlan, octet, sizing)
+    vm['windows'] = {'sysprep': True}
+    # Prep has no depends_on so it overlaps the DC promotion; only the join waits.
+    vm['roles'] = ['ludus_prep_child_member', {
+        'name': 'ludus_join_child_domain',
+        'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]
+    }]
+    vm['role_vars'] = {
+        'dc_ip': f"10.2.{pdc_vm['vlan']}.{pdc_vm['ip_last_octet']}",
+        'dns_domain_name': child_fqdn,
+        'child_domain_netbios_name': child_netbios
+    }
+    return vm
+
+# NetBIOS computer names are limited to 15 characters.
+MAX_HOSTNAME_LEN = 15
+DEFAULT_STAMP_PATTERN = "{NETBIOS}-{kind}{n:03}"
+
+def stamp_name_room(pattern, child_netbios, hostname):
+    """Characters of NetBIOS name that fit `pattern` within MAX_HOSTNAME_LEN, or None if it has no {NETBIOS}."""
+    if '{NETBIOS' not in pattern and '{netbios' not in pattern:
+        return None
+    return MAX_HOSTNAME_LEN - (len(hostname) - len(child_netbios))
+
+def default_stamp_pattern(child_netbios):
+    """DEFAULT_STAMP_PATTERN, truncating {NETBIOS} when the full name would exceed MAX_HOSTNAME_LEN."""
+    sample = DEFAULT_STAMP_PATTERN.format(NETBIOS=child_netbios.upper(), kind='WKS', n=1)
+    room = stamp_name_room(DEFAULT_STAMP_PATTERN, child_netbios, sample)
+    if len(child_netbios) <= room:
+        return DEFAULT_STAMP_PATTERN
+    return DEFAULT_STAMP_PATTERN.replace('{NETBIOS}', f'{{NETBIOS:.{room}}}')
+
+def stamp_members(pattern, count, vlan, child_fqdn, child_netbios, pdc_vm, allocator,
+                  workstation_sizing, server_sizing=None, server_ratio=0.0, start_octet=None, used_hostnames=()):
+    """
+    Expands `count` child-domain members from a hostname pattern in one go.
+
+    `pattern` is a str.format template with {NETBIOS}/{netbios} (the child's
+    NetBIOS name), {n} (1-based counter) and {kind} ('SRV' or 'WKS'). With
+    {kind} each kind is numbered on its own, e.g. '{NETBIOS}-{kind}{n:03}'.
+    A format spec such as '{NETBIOS:.8}' truncates long NetBIOS names.
+    round(count * server_ratio) members are servers, spread evenly through
+    the batch. Octets run up from start_octet, or come from each kind's
+    allocator range when it is None. Names already in `used_hostnames`
+    (the rest of the config) are rejected like repeats within the batch;
+    hostnames compare case-insensitively, as Windows and DNS treat them.
+    """
+    if not 0 <= server_ratio <= 1:
+        raise ValueError(f"server_ratio must be between 0 and 1, got {server_ratio}")
+    servers = round(count * server_ratio)
+    per_kind = '{kind' in pattern
+    counters = {'server': 0, 'workstation': 0}
+    vms, hostnames = [], set()
+    used_hostnames = {name.lower() for name in used_hostnames}
+    try:
+        for i in range(count):
+            # Even spread: member i is a server whenever the running server quota steps up.
+            kind = 'server' if (i + 1) * servers // count > i * servers // count else 'workstation'
+            counters[kind] += 1
+            try:
+                hostname = pattern.format(NETBIOS=child_netbios.upper(), netbios=child_netbios.lower(),
+                                          kind='SRV' if kind == 'server' else 'WKS',
+                                          n=counters[kind] if per_kind else i + 1)
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"bad hostname pattern '{pattern}': {e!r}")
+            if len(hostname) > MAX_HOSTNAME_LEN:
+                room = stamp_name_room(pattern, child_netbios, hostname)
+                hint = (f"; this pattern leaves room for {room} characters of NetBIOS name, "
+                        f"e.g. '{{NETBIOS:.{room}}}'" if room and room > 0 else "")
+                raise ValueError(f"hostname '{hostname}' is longer than {MAX_HOSTNAME_LEN} characters{hint}")
+            if hostname.lower() in hostnames:
+                raise ValueError(f"hostname pattern '{pattern}' repeats '{hostname}'; include {{n}}")
+            if hostname.lower() in used_hostnames:
+                raise ValueError(f"hostname '{hostname}' is already used in this config")
+            hostnames.add(hostname.lower())
+            if start_octet is None:
+                octet = allocator.allocate(vlan, kind, hostname)
+            else:
+                octet = allocator.claim(vlan, start_octet + i, hostname)
+            sizing = server_sizing if kind == 'server' and server_sizing else workstation_sizing
+            vms.append(child_member_vm(hostname, vlan, octet, sizing, child_fqdn, child_netbios, pdc_vm))
+    except ValueError:
+        # Leave the allocator as it was so the caller can retry with other settings.
+        for vm in vms:
+            allocator.release(vlan, vm['ip_last_octet'])
+        raise
+    return vms
+
 # --- Core Logic Functions ---
 
 def get_default_settings():
@@ -63,7 +247,7 @@ def get_default_settings():
     defaults['enable_dynamic_wallpaper'] = True
     return defaults
 
-def define_parent_domain(range_id):
+def define_parent_domain(range_id, allocator, prestaged=False):
     """Gathers details for the parent domain and its machines."""
     print_header("Parent Domain Configuration")
     vms = []
@@ -75,42 +259,22 @@ def define_parent_domain(range_id):
     # Primary DC
     print("\n--- Parent Primary DC ---")
     pdc_hostname = get_input("Primary DC Hostname", f"{netbios}-DC1")
-    pdc_ip_octet = get_int_input("Primary DC IP Last Octet", 10)
-    pdc_vm = {
-        'vm_name': f"{{{{ range_id }}}}-{pdc_hostname}",
-        'hostname': pdc_hostname,
-        'template': get_input("Template", "win2019-server-x64-template"),
-        'vlan': vlan,
-        'ip_last_octet': pdc_ip_octet,
-        'ram_gb': get_int_input("RAM (GB)", 4),
-        'cpus': get_int_input("CPUs", 4),
-        'domain': {'fqdn': fqdn, 'role': 'primary-dc'},
-        'windows': {'sysprep': True, 'gpos': ['disable_defender']},
-        'roles': ['ludus_verify_dc_ready']
-    }
-    vms.append(pdc_vm)
+    pdc_ip_octet = get_octet_input("Primary DC IP Last Octet", allocator, vlan, "dc", pdc_hostname)
+    sizing = prompt_sizing(prestaged_template("win2019-server-x64-template", prestaged), 4, 4)
+    vms.append(parent_pdc_vm(pdc_hostname, vlan, pdc_ip_octet, sizing, fqdn))
 
     # Optional Secondary DC
     if get_yes_no("Add a secondary DC to the parent domain?"):
         print("\n--- Parent Secondary DC ---")
         sdc_hostname = get_input("Secondary DC Hostname", f"{netbios}-DC2")
-        sdc_ip_octet = get_int_input("Secondary DC IP Last Octet", 11)
-        sdc_vm = {
-            'vm_name': f"{{{{ range_id }}}}-{sdc_hostname}",
-            'hostname': sdc_hostname,
-            'template': get_input("Template", "win2019-server-x64-template"),
-            'vlan': vlan,
-            'ip_last_octet': sdc_ip_octet,
-            'ram_gb': get_int_input("RAM (GB)", 4),
-            'cpus': get_int_input("CPUs", 2),
-            'windows': {'sysprep': True},
-            'domain': {'fqdn': fqdn, 'role': 'alt-dc'}
-        }
-        vms.append(sdc_vm)
+        sdc_ip_octet = get_octet_input("Secondary DC IP Last Octet", allocator, vlan, "dc", sdc_hostname)
+        sizing = prompt_sizing(prestaged_template("win2019-server-x64-template", prestaged), 4, 2)
+        vms.append(parent_sdc_vm(sdc_hostname, vlan, sdc_ip_octet, sizing, fqdn))
 
-    return vms, fqdn, netbios, vlan, pdc_ip_octet
+    return vms, fqdn, netbios, {'vlan': vlan, 'octet': pdc_ip_octet, 'hostname': pdc_hostname}
 
-def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_ip):
+def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, allocator, prestaged=False,
+                        used_hostnames=()):
     """Gathers details for a single child domain and its machines."""
     vms = []
     
@@ -121,99 +285,308 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_ip):
         
     child_fqdn = f"{child_name.lower()}.{parent_fqdn}"
     child_netbios = get_input("Child Domain NETBIOS Name", child_name.upper())
-    child_vlan = get_int_input(f"VLAN for {child_fqdn}", 20)
+    child_vlan = get_int_input(f"VLAN for {child_fqdn}", allocator.next_vlan())
 
     # Child Primary DC
     print(f"\n--- {child_netbios} Primary DC ---")
     pdc_hostname = get_input("Primary DC Hostname", f"{child_netbios.upper()}-DC1")
-    pdc_ip_octet = get_int_input("Primary DC IP Last Octet", 10)
-    
-    pdc_vm = {
-        'vm_name': f"{{{{ range_id }}}}-{pdc_hostname}",
-        'hostname': pdc_hostname,
-        'template': get_input("Template", "win2019-server-x64-template"),
-        'vlan': child_vlan,
-        'ip_last_octet': pdc_ip_octet,
-        'ram_gb': get_int_input("RAM (GB)", 4),
-        'cpus': get_int_input("CPUs", 4),
-        'windows': {'sysprep': True},
-        'roles': [{
-            'name': 'ludus_create_child_domain',
-            'depends_on': [{'vm_name': f"{{{{ range_id }}}}-{parent_netbios}-DC1", 'role': 'ludus_verify_dc_ready'}]
-        }],
-        'role_vars': {
-            'dns_domain_name': child_fqdn,
-            'parent_domain_netbios_name': parent_netbios,
-            'parent_dc_ip': f"10.2.{parent_dc_ip['vlan']}.{parent_dc_ip['octet']}"
-        }
-    }
+    pdc_ip_octet = get_octet_input("Primary DC IP Last Octet", allocator, child_vlan, "dc", pdc_hostname)
+    sizing = prompt_sizing(prestaged_template("win2019-server-x64-template", prestaged), 4, 4)
+    pdc_vm = child_pdc_vm(pdc_hostname, child_vlan, pdc_ip_octet, sizing, child_fqdn, parent_netbios, parent_dc_info)
     vms.append(pdc_vm)
 
     # Optional Secondary DC
     if get_yes_no(f"Add a secondary DC to the {child_netbios} domain?"):
         print(f"\n--- {child_netbios} Secondary DC ---")
         sdc_hostname = get_input("Secondary DC Hostname", f"{child_netbios.upper()}-DC2")
-        sdc_ip_octet = get_int_input("Secondary DC IP Last Octet", 11)
-        sdc_vm = {
-            'vm_name': f"{{{{ range_id }}}}-{sdc_hostname}",
-            'hostname': sdc_hostname,
-            'template': get_input("Template", "win2022-server-x64-template"),
-            'vlan': child_vlan,
-            'ip_last_octet': sdc_ip_octet,
-            'ram_gb': get_int_input("RAM (GB)", 4),
-            'cpus': get_int_input("CPUs", 2),
-            'windows': {'sysprep': True},
-            'roles': [{
-                'name': 'ludus_secondary_child_dc',
-                'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]
-            }],
-            'role_vars': {
-                'dns_domain_name': child_fqdn,
-                'parent_domain_netbios_name': parent_netbios,
-                'existing_dc_ip': f"10.2.{child_vlan}.{pdc_ip_octet}"
-            }
-        }
-        vms.append(sdc_vm)
+        sdc_ip_octet = get_octet_input("Secondary DC IP Last Octet", allocator, child_vlan, "dc", sdc_hostname)
+        sizing = prompt_sizing(prestaged_template("win2022-server-x64-template", prestaged), 4, 2)
+        ifm = get_yes_no("Seed it from IFM media of the primary DC instead of network replication?")
+        vms.append(child_sdc_vm(sdc_hostname, child_vlan, sdc_ip_octet, sizing, child_fqdn, parent_netbios, pdc_vm, ifm))
 
     # Child Members
+    if get_yes_no(f"Bulk-stamp {child_netbios} members from a hostname pattern?"):
+        used = set(used_hostnames) | {vm['hostname'] for vm in vms}
+        vms.extend(prompt_member_stamp(child_vlan, child_fqdn, child_netbios, pdc_vm, allocator, used))
     num_members = get_int_input(f"How many member workstations/servers for {child_netbios}?", 0)
     for i in range(num_members):
         print(f"\n--- {child_netbios} Member #{i+1} ---")
-        mem_hostname = get_input("Member Hostname", f"{child_netbios}-WKS{i+1}")
-        mem_ip_octet = get_int_input("Member IP Last Octet", 100 + i)
+        default_hostname = f"{child_netbios}-WKS{i+1}"
+        mem_hostname = get_input("Member Hostname", default_hostname)
+        used = {name.lower() for name in used_hostnames} | {vm['hostname'].lower() for vm in vms}
+        while mem_hostname.lower() in used:
+            print(f"Hostname '{mem_hostname}' is already used in this config.", file=sys.stderr)
+            suggestion = default_hostname if default_hostname.lower() not in used else None
+            mem_hostname = None
+            while not mem_hostname:
+                mem_hostname = get_input("Member Hostname", suggestion)
         is_server = get_yes_no("Is this a server (vs. a workstation)?")
-        
-        mem_vm = {
-            'vm_name': f"{{{{ range_id }}}}-{mem_hostname}",
-            'hostname': mem_hostname,
+        mem_ip_octet = get_octet_input("Member IP Last Octet", allocator, child_vlan,
+                                       "server" if is_server else "workstation", mem_hostname)
+        sizing = {
             'template': "win2022-server-x64-template" if is_server else "win10-22h2-x64-enterprise-template",
-            'vlan': child_vlan,
-            'ip_last_octet': mem_ip_octet,
             'ram_gb': get_int_input("RAM (GB)", 4),
-            'cpus': get_int_input("CPUs", 2),
-            'windows': {'sysprep': True},
-            'roles': [{
-                'name': 'ludus_join_child_domain',
-                'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]
-            }],
-            'role_vars': {
-                'dc_ip': f"10.2.{child_vlan}.{pdc_ip_octet}",
-                'dns_domain_name': child_fqdn,
-                'child_domain_netbios_name': child_netbios
-            }
+            'cpus': get_int_input("CPUs", 2)
         }
-        vms.append(mem_vm)
+        vms.append(child_member_vm(mem_hostname, child_vlan, mem_ip_octet, sizing, child_fqdn, child_netbios, pdc_vm))
         
     return vms
 
+def prompt_member_stamp(child_vlan, child_fqdn, child_netbios, pdc_vm, allocator, used_hostnames=()):
+    """Asks once for a pattern, count, server ratio, octets and profiles, then stamps the members."""
+    default_pattern = default_stamp_pattern(child_netbios)
+    print(f"Hostnames are limited to {MAX_HOSTNAME_LEN} characters; {child_netbios} is {len(child_netbios)}.")
+    while True:
+        pattern = get_input("Hostname pattern ({NETBIOS}, {kind} = SRV/WKS, {n})", default_pattern)
+        count = get_int_input("Number of members", 10)
+        start = get_input("Starting IP last octet (blank = next free in each role's range)", "")
+        workstation_profile = get_input(f"Workstation sizing profile ({', '.join(DEFAULT_PROFILES)})", "workstation")
+        try:
+            server_ratio = float(get_input("Share of servers (0-1)", "0"))
+            server_profile = get_input("Server sizing profile", "server") if server_ratio else "server"
+            return stamp_members(pattern, count, child_vlan, child_fqdn, child_netbios, pdc_vm, allocator,
+                                 DEFAULT_PROFILES[workstation_profile], DEFAULT_PROFILES[server_profile],
+                                 server_ratio, int(start) if start else None, used_hostnames)
+        except KeyError as e:
+            print(f"Unknown sizing profile {e}.", file=sys.stderr)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+
+# --- Headless Topology Spec ---
+
+# Sizing profiles used by --spec mode. They mirror the interactive defaults
+# and can be overridden or extended under `profiles:` in the spec file.
+DEFAULT_PROFILES = {
+    'dc': {'template': "win2019-server-x64-template", 'ram_gb': 4, 'cpus': 4},
+    'secondary_dc': {'template': "win2022-server-x64-template", 'ram_gb': 4, 'cpus': 2},
+    'server': {'template': "win2022-server-x64-template", 'ram_gb': 4, 'cpus': 2},
+    'workstation': {'template': "win10-22h2-x64-enterprise-template", 'ram_gb': 4, 'cpus': 2}
+}
+
+DEFAULT_SETTINGS = {
+    'ad_domain_admin': "domainadmin",
+    'ad_domain_admin_password': "password",
+    'ad_domain_user': "domainuser",
+    'ad_domain_user_password': "password",
+    'ad_domain_safe_mode_password': "YourComplexPassword!1",
+    'timezone': "America/Chicago",
+    'ad_domain_functional_level': "Win2012R2",
+    'ad_forest_functional_level': "Win2012R2",
+    'snapshot_with_RAM': True,
+    'stale_hours': 0,
+    'enable_dynamic_wallpaper': True
+}
+
+def load_spec(path):
+    """Reads a topology spec (YAML) from disk."""
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"{path}: topology spec must be a mapping")
+    return spec
+
+def expand_spec(spec, allocator=None):
+    """
+    Expands a compact topology spec into a full ludus config in one pass.
+
+    Example spec:
+
+        forest: {fqdn: ershon.local, netbios: ERSHON, vlan: 10, secondary_dcs: 1}
+        children:
+          - {name: springfield, secondary_dcs: 1, workstations: 20, servers: 2}
+          - {name: shelbyville, vlan: 40, workstations: 5, workstation_profile: small}
+          - name: ogdenville
+            stamp: {pattern: "OGD-{kind}{n:03}", count: 80, server_ratio: 0.1, profile: small}
+        profiles:
+          small: {template: win10-22h2-x64-enterprise-template, ram_gb: 2, cpus: 1}
+        defaults: {timezone: Europe/London}
+
+    Child VLANs default to the next unused of 20, 30, 40, ...; octets come
+    from the role ranges in scripts/ip_allocator.py (DCs 10-19, servers
+    20-99, workstations 100-199). Collisions raise AllocationError.
+    `clone_policy: recommended` sets full_clone per VM as capacity_plan.py
+    recommends.
+    """
+    allocator = allocator or IPAllocator()
+    profiles = {**DEFAULT_PROFILES, **(spec.get('profiles') or {})}
+
+    def sizing(name):
+        if name not in profiles:
+            raise ValueError(f"unknown sizing profile '{name}'")
+        profile = {**DEFAULT_PROFILES.get(name, DEFAULT_PROFILES['server']), **profiles[name]}
+        return {k: profile[k] for k in ('template', 'ram_gb', 'cpus')}
+
+    def dc_sizing(name):
+        dc = sizing(name)
+        dc['template'] = prestaged_template(dc['template'], spec.get('prestaged_dc_templates', False))
+        return dc
+
+    forest = spec.get('forest') or {}
+    if not forest.get('fqdn'):
+        raise ValueError("spec is missing forest.fqdn")
+    fqdn = forest['fqdn']
+    netbios = forest.get('netbios', fqdn.split('.')[0].upper())
+    vlan = forest.get('vlan', 10)
+
+    config = {
+        'defaults': {**DEFAULT_SETTINGS, **(spec.get('defaults') or {})},
+        'network': {
+            'inter_vlan_default': 'ACCEPT',
+            'external_default': 'ACCEPT'
+        },
+        'ludus': []
+    }
+    vms = config['ludus']
+
+    # Parent domain
+    pdc_hostname = forest.get('dc_hostname', f"{netbios}-DC1")
+    if 'dc_octet' in forest:
+        pdc_octet = allocator.claim(vlan, forest['dc_octet'], pdc_hostname)
+    else:
+        pdc_octet = allocator.allocate(vlan, 'dc', pdc_hostname)
+    vms.append(parent_pdc_vm(pdc_hostname, vlan, pdc_octet, dc_sizing(forest.get('dc_profile', 'dc')), fqdn))
+    for i in range(forest.get('secondary_dcs', 0)):
+        sdc_hostname = f"{netbios}-DC{i+2}"
+        vms.append(parent_sdc_vm(sdc_hostname, vlan, allocator.allocate(vlan, 'dc', sdc_hostname),
+                                 dc_sizing(forest.get('secondary_dc_profile', 'secondary_dc')), fqdn))
+    parent_dc_info = {'vlan': vlan, 'octet': pdc_octet, 'hostname': pdc_hostname}
+
+    # Child domains
+    children = spec.get('children') or []
+    explicit_vlans = {vlan} | {child['vlan'] for child in children if 'vlan' in child}
+    for n, child in enumerate(children):
+        if 'name' not in child:
+            raise ValueError(f"children[{n}] is missing 'name'")
+        child_fqdn = f"{child['name'].lower()}.{fqdn}"
+        child_netbios = child.get('netbios', child['name'].upper())
+        child_vlan = child['vlan'] if 'vlan' in child else allocator.next_vlan(exclude=explicit_vlans)
+
+        pdc_hostname = f"{child_netbios}-DC1"
+        pdc_vm = child_pdc_vm(pdc_hostname, child_vlan, allocator.allocate(child_vlan, 'dc', pdc_hostname),
+                              dc_sizing(child.get('dc_profile', 'dc')), child_fqdn, netbios, parent_dc_info)
+        vms.append(pdc_vm)
+        ifm = child.get('ifm', spec.get('secondary_dc_ifm', False))
+        for i in range(child.get('secondary_dcs', 0)):
+            sdc_hostname = f"{child_netbios}-DC{i+2}"
+            vms.append(child_sdc_vm(sdc_hostname, child_vlan, allocator.allocate(child_vlan, 'dc', sdc_hostname),
+                                    dc_sizing(child.get('secondary_dc_profile', 'secondary_dc')),
+                                    child_fqdn, netbios, pdc_vm, ifm))
+
+        for kind, prefix in (('server', 'SRV'), ('workstation', 'WKS')):
+            member_sizing = sizing(child.get(f'{kind}_profile', kind))
+            for i in range(child.get(f'{kind}s', 0)):
+                hostname = f"{child_netbios}-{prefix}{i+1}"
+                vms.append(child_member_vm(hostname, child_vlan, allocator.allocate(child_vlan, kind, hostname),
+                                           member_sizing, child_fqdn, child_netbios, pdc_vm))
+
+        stamps = child.get('stamp') or []
+        for k, stamp in enumerate([stamps] if isinstance(stamps, dict) else stamps):
+            if not isinstance(stamp, dict) or 'count' not in stamp:
+                raise ValueError(f"children[{n}].stamp[{k}] needs a count")
+            vms.extend(stamp_members(stamp.get('pattern', default_stamp_pattern(child_netbios)), stamp['count'], child_vlan,
+                                     child_fqdn, child_netbios, pdc_vm, allocator,
+                                     sizing(stamp.get('profile', 'workstation')),
+                                     sizing(stamp.get('server_profile', 'server')),
+                                     stamp.get('server_ratio', 0.0), stamp.get('start_octet'),
+                                     {vm['hostname'] for vm in vms}))
+
+    if spec.get('clone_policy') == 'recommended':
+        apply_clone_recommendations(config)
+    return config
+
+# --- Output ---
+
+# libyaml's emitter when PyYAML was built with it, the pure-Python one otherwise.
+_BaseDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+class ConfigDumper(_BaseDumper):
+    """
+    Dumper for generated configs, scoped to this tool (no global representers).
+
+    No str representer is needed for Jinja values: the emitter never writes
+    '{' in a plain scalar, so '{{ range_id }}-DC1' is single-quoted as before.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+class AnchoredConfigDumper(ConfigDumper):
+    """ConfigDumper that writes objects referenced more than once as an anchor plus aliases."""
+
+    def ignore_aliases(self, data):
+        return _BaseDumper.ignore_aliases(self, data)
+
+# Per-VM keys whose identical values are written once when anchoring.
+SHARED_KEYS = ('role_vars', 'roles')
+
+def share_vm_values(config):
+    """
+    Copy of `config` where VMs with equal SHARED_KEYS values reference one object.
+
+    Members of a domain carry the same role_vars (dc_ip, dns_domain_name,
+    child_domain_netbios_name) and roles; AnchoredConfigDumper then emits
+    each once as &idNNN and every other VM as *idNNN.
+    """
+    seen = {}
+    vms = []
+    for vm in config['ludus']:
+        vm = dict(vm)
+        for key in SHARED_KEYS:
+            if vm.get(key):
+                vm[key] = seen.setdefault((key, json.dumps(vm[key], sort_keys=True)), vm[key])
+        vms.append(vm)
+    return {**config, 'ludus': vms}
+
+def write_config(config, output_filename, anchors=False):
+    """Dumps the configuration to a YAML file, optionally with anchors for shared per-domain values."""
+    dumper = AnchoredConfigDumper if anchors else ConfigDumper
+    if anchors:
+        config = share_vm_values(config)
+    with open(output_filename, 'w') as f:
+        yaml.dump(config, f, Dumper=dumper, default_flow_style=False, sort_keys=False, indent=2)
+
 # --- Main Execution ---
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a ludus-config.yml for the forest build roles.")
+    parser.add_argument("--spec", help="Topology spec (YAML) to expand without prompting")
+    parser.add_argument("--prestaged-dc-templates", action="store_true",
+                        help="Use the '-adds-' variant of each DC template (see ludus_prestage_adds)")
+    parser.add_argument("-o", "--output", help="Output file (default: generated-config.yml, or 'output' from the spec)")
+    parser.add_argument("--anchors", action="store_true",
+                        help="Write role_vars/roles shared by several VMs once, as YAML anchors and aliases")
+    return parser.parse_args()
+
 def main():
     """Main function to drive the configuration script."""
+    args = parse_args()
+
+    if args.spec:
+        try:
+            spec = load_spec(args.spec)
+            if args.prestaged_dc_templates:
+                spec['prestaged_dc_templates'] = True
+            allocator = IPAllocator()
+            config = expand_spec(spec, allocator)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        output_filename = args.output or spec.get('output', "generated-config.yml")
+        write_config(config, output_filename, args.anchors or spec.get('yaml_anchors', False))
+        print(f"Wrote {len(config['ludus'])} VMs to {output_filename}")
+        allocator.print_report()
+        # Without a declared host the plan would judge the range against made-up capacity.
+        if spec.get('host') or HOST_FROM_ENV:
+            print_plan(plan(config, spec.get('host')))
+        else:
+            print("No host capacity given (spec 'host' or LUDUS_HOST_CPUS/RAM_GB/DISK_GB); skipping the capacity plan.")
+        return
+
     print("Welcome to the Ludus Forest Build Roles Config Generator!")
     print("This script will guide you through creating a ludus-config.yml file.")
     
     range_id = get_input("Enter your Ludus Range ID (e.g., MH)", "MH")
+    allocator = IPAllocator()
     
     config = {
         'defaults': get_default_settings(),
@@ -224,30 +597,22 @@ def main():
         'ludus': []
     }
 
-    parent_vms, parent_fqdn, parent_netbios, parent_vlan, parent_octet = define_parent_domain(range_id)
+    parent_vms, parent_fqdn, parent_netbios, parent_dc_info = define_parent_domain(range_id, allocator, args.prestaged_dc_templates)
     config['ludus'].extend(parent_vms)
-    
-    parent_dc_ip_info = {'vlan': parent_vlan, 'octet': parent_octet}
 
     while get_yes_no("Add a child domain?"):
-        child_vms = define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_ip_info)
+        child_vms = define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, allocator,
+                                        args.prestaged_dc_templates, {vm['hostname'] for vm in config['ludus']})
         config['ludus'].extend(child_vms)
 
     # Save the configuration to a YAML file
-    output_filename = "generated-config.yml"
-    with open(output_filename, 'w') as f:
-        # Use a custom representer to handle the templated strings correctly
-        def str_presenter(dumper, data):
-            if '{{' in data:
-                return dumper.represent_scalar('tag:yaml.org,2002:str', data, style="'")
-            return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-        
-        yaml.add_representer(str, str_presenter)
-        yaml.dump(config, f, default_flow_style=False, sort_keys=False, indent=2)
+    output_filename = args.output or "generated-config.yml"
+    write_config(config, output_filename, args.anchors)
 
     print("\n" + "="*60)
     print(f"Success! Configuration written to {output_filename}".center(60))
     print("="*60)
+    allocator.print_report()
 
 if __name__ == "__main__":
     main()
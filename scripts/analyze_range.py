@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+analyze_range.py
+
+Dependency analysis for a generated Ludus range config:
+- Builds the role DAG from each VM's roles and depends_on entries
+- Reports dangling depends_on references and dependency cycles
+- Computes the critical path, maximum parallel width and an estimated
+  wall-clock deploy time from per-role duration baselines
+
+Usage:
+    python3 analyze_range.py generated-config.yml [--baselines durations.yml] [--json]
+"""
+
+import sys
+import json
+import argparse
+
+import yaml
+
+# --------------------------------------------------------------------------
+# Duration baselines (seconds)
+# --------------------------------------------------------------------------
+
+# Typical run time of each user role once its VM is up.
+ROLE_BASELINES = {
+    "ludus_verify_dc_ready": 60,
+    "ludus_create_child_domain": 1200,
+    "ludus_secondary_child_dc": 900,
+    "ludus_prep_child_member": 240,
+    "ludus_join_child_domain": 240,
+}
+DEFAULT_ROLE_SECONDS = 300
+
+# Ludus' own per-VM work before user roles: clone, sysprep and the native
+# domain setup selected by `domain.role`.
+PROVISION_BASELINES = {
+    "primary-dc": 1500,
+    "alt-dc": 1200,
+    "member": 600,
+}
+DEFAULT_PROVISION_SECONDS = 600
+
+PROVISION = "(provision)"
+
+# --------------------------------------------------------------------------
+# Config helpers
+# --------------------------------------------------------------------------
+
+def load_config(path):
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    if not isinstance(config.get("ludus"), list):
+        raise ValueError(f"{path}: no 'ludus' VM list found")
+    return config
+
+def vm_roles(vm):
+    """Return [(role_name, depends_on list)] for a VM; roles may be plain strings or dicts."""
+    roles = []
+    for entry in vm.get("roles") or []:
+        if isinstance(entry, str):
+            roles.append((entry, []))
+        else:
+            roles.append((entry.get("name"), entry.get("depends_on") or []))
+    return roles
+
+def node_label(node):
+    vm_name, role = node
+    return f"{vm_name} {role}"
+
+# --------------------------------------------------------------------------
+# Graph
+# --------------------------------------------------------------------------
+
+def build_graph(config, baselines=None):
+    """
+    Build the deploy DAG.
+
+    Nodes are (vm_name, role) plus one (vm_name, PROVISION) node per VM.
+    A VM's roles run after its provisioning and in list order; depends_on
+    adds cross-VM edges; native alt-dc/member VMs wait for their domain's
+    primary-dc. Returns (durations, preds, problems).
+    """
+    role_seconds = {**ROLE_BASELINES, **(baselines or {})}
+    durations, preds, problems = {}, {}, []
+    vms = {vm.get("vm_name"): vm for vm in config["ludus"]}
+    primary_dcs = {}
+    for vm in config["ludus"]:
+        domain = vm.get("domain") or {}
+        if domain.get("role") == "primary-dc":
+            primary_dcs[domain.get("fqdn")] = vm["vm_name"]
+
+    for vm_name, vm in vms.items():
+        domain = vm.get("domain") or {}
+        provision = (vm_name, PROVISION)
+        durations[provision] = role_seconds.get(domain.get("role"),
+                                                PROVISION_BASELINES.get(domain.get("role"), DEFAULT_PROVISION_SECONDS))
+        preds[provision] = set()
+        pdc = primary_dcs.get(domain.get("fqdn"))
+        if domain.get("role") in ("alt-dc", "member") and pdc and pdc != vm_name:
+            preds[provision].add((pdc, PROVISION))
+
+        previous = provision
+        for role, depends_on in vm_roles(vm):
+            node = (vm_name, role)
+            durations[node] = role_seconds.get(role, DEFAULT_ROLE_SECONDS)
+            preds[node] = {previous}
+            previous = node
+            for dep in depends_on:
+                target_vm, target_role = dep.get("vm_name"), dep.get("role")
+                if target_vm not in vms:
+                    problems.append(f"{node_label(node)}: depends_on unknown vm_name '{target_vm}'")
+                elif target_role not in [r for r, _ in vm_roles(vms[target_vm])]:
+                    problems.append(f"{node_label(node)}: depends_on role '{target_role}' is not assigned to {target_vm}")
+                else:
+                    preds[node].add((target_vm, target_role))
+    return durations, preds, problems
+
+def find_cycles(preds):
+    """Return dependency cycles (lists of nodes) using Tarjan's SCC algorithm."""
+    index, low, on_stack, stack, cycles = {}, {}, set(), [], []
+    counter = [0]
+
+    def visit(root):
+        # Iterative DFS so deep dependency chains cannot hit the recursion limit.
+        work = [(root, iter(sorted(preds.get(root, ()))))]
+        index[root] = low[root] = counter[0]
+        counter[0] += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter[0]
+                    counter[0] += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(sorted(preds.get(child, ())))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in preds.get(node, ()):
+                        cycles.append(component[::-1])
+
+    for node in sorted(preds):
+        if node not in index:
+            visit(node)
+    return cycles
+
+def topological_order(preds):
+    """Kahn's algorithm; nodes that sit on a cycle are left out."""
+    succs = successors(preds)
+    remaining = {node: len(p) for node, p in preds.items()}
+    ready = sorted(node for node, count in remaining.items() if count == 0)
+    order = []
+    while ready:
+        node = ready.pop()
+        order.append(node)
+        for succ in succs.get(node, ()):
+            remaining[succ] -= 1
+            if remaining[succ] == 0:
+                ready.append(succ)
+    return order
+
+def successors(preds):
+    succs = {node: set() for node in preds}
+    for node, parents in preds.items():
+        for parent in parents:
+            succs.setdefault(parent, set()).add(node)
+    return succs
+
+def dependents(preds, roots):
+    """All nodes reachable downstream of `roots` (roots included)."""
+    succs = successors(preds)
+    seen, todo = set(roots), list(roots)
+    while todo:
+        for succ in succs.get(todo.pop(), ()):
+            if succ not in seen:
+                seen.add(succ)
+                todo.append(succ)
+    return seen
+
+def schedule(durations, preds):
+    """
+    Earliest-start schedule with unlimited parallelism.
+
+    Returns (start, finish, critical_path, max_width) for an acyclic graph.
+    """
+    start, finish, via = {}, {}, {}
+    for node in topological_order(preds):
+        parents = preds[node]
+        latest = max(parents, key=lambda p: finish[p], default=None)
+        start[node] = finish[latest] if latest else 0
+        finish[node] = start[node] + durations[node]
+        via[node] = latest
+
+    path, node = [], max(finish, key=finish.get, default=None)
+    while node is not None:
+        path.append(node)
+        node = via[node]
+
+    # Sweep start/finish events; finishes sort before starts at the same instant.
+    events = sorted([(t, 1) for t in start.values()] + [(t, -1) for t in finish.values()],
+                    key=lambda e: (e[0], e[1]))
+    width = max_width = 0
+    for _, delta in events:
+        width += delta
+        max_width = max(max_width, width)
+    return start, finish, path[::-1], max_width
+
+# --------------------------------------------------------------------------
+# Report
+# --------------------------------------------------------------------------
+
+def fmt_seconds(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+def analyze(config, baselines=None):
+    durations, preds, problems = build_graph(config, baselines)
+    cycles = find_cycles(preds)
+    report = {
+        "vms": len(config["ludus"]),
+        "nodes": len(durations),
+        "problems": problems,
+        "cycles": [[node_label(n) for n in cycle] for cycle in cycles],
+    }
+    if not cycles:
+        start, finish, path, width = schedule(durations, preds)
+        total = max(finish.values(), default=0)
+        work = sum(durations.values())
+        report.update({
+            "estimated_seconds": total,
+            "serial_seconds": work,
+            "average_parallelism": round(work / total, 2) if total else 0,
+            "max_parallel_width": width,
+            "critical_path": [{"node": node_label(n), "start": start[n], "seconds": durations[n]} for n in path],
+        })
+    return report
+
+def print_report(report):
+    print(f"VMs: {report['vms']}   DAG nodes: {report['nodes']}")
+    for problem in report["problems"]:
+        print(f"  ✗ {problem}")
+    for cycle in report["cycles"]:
+        print(f"  ✗ cycle: {' -> '.join(cycle)}")
+    if "estimated_seconds" not in report:
+        return
+    print(f"\nEstimated deploy time : {fmt_seconds(report['estimated_seconds'])}")
+    print(f"Fully serial time     : {fmt_seconds(report['serial_seconds'])}")
+    print(f"Average parallelism   : {report['average_parallelism']}")
+    print(f"Max parallel width    : {report['max_parallel_width']}")
+    print(f"\nCritical path ({len(report['critical_path'])} steps):")
+    for step in report["critical_path"]:
+        print(f"  {fmt_seconds(step['start']):>10} +{fmt_seconds(step['seconds']):>8}  {step['node']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the role dependency DAG of a Ludus range config.")
+    parser.add_argument("config", help="Generated ludus range config (YAML)")
+    parser.add_argument("--baselines", help="YAML mapping of role name (or domain role) to seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+        baselines = None
+        if args.baselines:
+            with open(args.baselines) as f:
+                baselines = yaml.safe_load(f) or {}
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    report = analyze(config, baselines)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(1 if report["problems"] or report["cycles"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+capacity_plan.py
+
+Planning stage for a Ludus range config, before anything is cloned:
+- Sums vCPU, RAM and estimated disk per domain and per tier (dc, server,
+  workstation, attacker, infra) against a declared host capacity
+- Warns about RAM overcommit (Proxmox will swap or OOM-kill guests),
+  high vCPU:core ratios and disk exhaustion
+- Recommends a clone type per VM from its lifetime/I-O profile: DCs are
+  long-lived and write-heavy (NTDS, SYSVOL replication) -> full clones;
+  throwaway workstations/servers -> linked clones
+
+Usage:
+    python3 capacity_plan.py generated-config.yml [--cpus 32] [--ram-gb 128] [--disk-gb 1000] [--apply] [--json]
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+import yaml
+
+from analyze_range import load_config
+from lint_range_config import vm_domain
+
+# Declared host capacity, overridable per run or via the environment.
+DEFAULT_HOST = {
+    "cpus": int(os.environ.get("LUDUS_HOST_CPUS", 32)),
+    "ram_gb": int(os.environ.get("LUDUS_HOST_RAM_GB", 128)),
+    "disk_gb": int(os.environ.get("LUDUS_HOST_DISK_GB", 1000)),
+}
+# Whether any LUDUS_HOST_* variable is set; otherwise DEFAULT_HOST is only a guess.
+HOST_FROM_ENV = any(os.environ.get(f"LUDUS_HOST_{key.upper()}") for key in DEFAULT_HOST)
+# RAM kept back for Proxmox itself and ZFS ARC.
+HOST_RESERVED_RAM_GB = 8
+
+CPU_OVERCOMMIT_WARN = 4.0    # vCPU per physical core
+DISK_USAGE_WARN = 0.85
+
+TIERS = ("dc", "server", "workstation", "attacker", "infra")
+
+# Full-clone disk footprint by template name fragment (first match wins).
+TEMPLATE_DISK_GB = [
+    ("kali", 80),
+    ("server", 60),
+    ("win", 50),
+]
+DEFAULT_TEMPLATE_DISK_GB = 25
+
+# Linked clones only store their delta from the template.
+LINKED_DELTA_GB = {"dc": 20, "server": 15, "workstation": 10, "attacker": 15, "infra": 5}
+
+# Clone type per tier: True = full clone.
+CLONE_POLICY = {"dc": True, "server": False, "workstation": False, "attacker": False, "infra": False}
+
+# --------------------------------------------------------------------------
+# Per-VM estimates
+# --------------------------------------------------------------------------
+
+def vm_tier(vm):
+    _, dc_kind = vm_domain(vm)
+    if dc_kind:
+        return "dc"
+    name = f"{vm.get('template', '')} {vm.get('vm_name', '')}".lower()
+    if "kali" in name or "attack" in name or "teamserver" in name:
+        return "attacker"
+    if "server" in name:
+        return "server"
+    if "win" in name:
+        return "workstation"
+    return "infra"
+
+def template_disk_gb(template):
+    template = str(template or "").lower()
+    return next((gb for fragment, gb in TEMPLATE_DISK_GB if fragment in template), DEFAULT_TEMPLATE_DISK_GB)
+
+def vm_estimate(vm):
+    """Resources and clone recommendation for one VM."""
+    tier = vm_tier(vm)
+    full = CLONE_POLICY[tier]
+    full_disk = template_disk_gb(vm.get("template"))
+    return {
+        "vm_name": vm.get("vm_name"),
+        "domain": vm_domain(vm)[0] or "(none)",
+        "tier": tier,
+        "cpus": int(vm.get("cpus") or 0),
+        "ram_gb": int(vm.get("ram_gb") or vm.get("ram") or 0),
+        "disk_gb": full_disk if full else min(full_disk, LINKED_DELTA_GB[tier]),
+        "full_clone": full,
+        "configured_full_clone": bool(vm.get("full_clone", False)),
+    }
+
+# --------------------------------------------------------------------------
+# Plan
+# --------------------------------------------------------------------------
+
+def totals(estimates):
+    return {
+        "vms": len(estimates),
+        "cpus": sum(e["cpus"] for e in estimates),
+        "ram_gb": sum(e["ram_gb"] for e in estimates),
+        "disk_gb": sum(e["disk_gb"] for e in estimates),
+    }
+
+def plan(config, host=None):
+    """Return the capacity plan for a loaded config against `host` capacity."""
+    host = {**DEFAULT_HOST, **(host or {})}
+    estimates = [vm_estimate(vm) for vm in config["ludus"]]
+    by_domain, by_tier = defaultdict(list), defaultdict(list)
+    for e in estimates:
+        by_domain[e["domain"]].append(e)
+        by_tier[e["tier"]].append(e)
+
+    total = totals(estimates)
+    usable_ram = max(host["ram_gb"] - HOST_RESERVED_RAM_GB, 0)
+    warnings = []
+    if total["ram_gb"] > usable_ram:
+        warnings.append(f"RAM overcommitted: {total['ram_gb']} GB requested, {usable_ram} GB usable "
+                        f"({host['ram_gb']} GB - {HOST_RESERVED_RAM_GB} GB host reserve)")
+    if host["cpus"] and total["cpus"] / host["cpus"] > CPU_OVERCOMMIT_WARN:
+        warnings.append(f"vCPU overcommit {total['cpus'] / host['cpus']:.1f}:1 exceeds {CPU_OVERCOMMIT_WARN:.0f}:1 "
+                        f"({total['cpus']} vCPUs on {host['cpus']} cores)")
+    if total["disk_gb"] > host["disk_gb"] * DISK_USAGE_WARN:
+        warnings.append(f"Estimated disk {total['disk_gb']} GB exceeds {DISK_USAGE_WARN:.0%} of {host['disk_gb']} GB")
+    mismatched = [e["vm_name"] for e in estimates if e["full_clone"] != e["configured_full_clone"]]
+
+    return {
+        "host": host,
+        "total": total,
+        "domains": {d: totals(es) for d, es in sorted(by_domain.items())},
+        "tiers": {t: totals(by_tier[t]) for t in TIERS if by_tier[t]},
+        "vms": estimates,
+        "clone_changes": mismatched,
+        "warnings": warnings,
+    }
+
+def apply_clone_recommendations(config):
+    """Set full_clone on every VM to the recommended value; returns the number changed."""
+    changed = 0
+    for vm in config["ludus"]:
+        full = CLONE_POLICY[vm_tier(vm)]
+        if bool(vm.get("full_clone", False)) != full:
+            changed += 1
+        vm["full_clone"] = full
+    return changed
+
+# --------------------------------------------------------------------------
+# Report
+# --------------------------------------------------------------------------
+
+def print_plan(report, out=sys.stdout):
+    host, total = report["host"], report["total"]
+
+    def row(label, t):
+        print(f"  {label:<34} {t['vms']:>4} {t['cpus']:>6} {t['ram_gb']:>8} {t['disk_gb']:>8}", file=out)
+
+    print(f"\nHost: {host['cpus']} cores, {host['ram_gb']} GB RAM, {host['disk_gb']} GB disk", file=out)
+    print(f"  {'':<34} {'VMs':>4} {'vCPU':>6} {'RAM GB':>8} {'disk GB':>8}", file=out)
+    for domain, t in report["domains"].items():
+        row(domain, t)
+    print("  " + "-" * 64, file=out)
+    for tier, t in report["tiers"].items():
+        row(f"tier: {tier}", t)
+    print("  " + "-" * 64, file=out)
+    row("total", total)
+    print(f"  {'usage vs host':<34} {'':>4} {total['cpus'] / max(host['cpus'], 1):>5.1f}x "
+          f"{total['ram_gb'] / max(host['ram_gb'], 1):>7.0%} {total['disk_gb'] / max(host['disk_gb'], 1):>7.0%}", file=out)
+
+    full = [e["vm_name"] for e in report["vms"] if e["full_clone"]]
+    print(f"\nRecommended clones: {len(full)} full (DCs), {len(report['vms']) - len(full)} linked", file=out)
+    if report["clone_changes"]:
+        print(f"  {len(report['clone_changes'])} VM(s) differ from the recommendation", file=out)
+    for warning in report["warnings"]:
+        print(f"  ⚠ {warning}", file=out)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a Ludus range config against host capacity and recommend clone types.")
+    parser.add_argument("config", help="Generated ludus range config (YAML)")
+    parser.add_argument("--cpus", type=int, help=f"Host physical cores (default {DEFAULT_HOST['cpus']}, env LUDUS_HOST_CPUS)")
+    parser.add_argument("--ram-gb", type=int, help=f"Host RAM in GB (default {DEFAULT_HOST['ram_gb']}, env LUDUS_HOST_RAM_GB)")
+    parser.add_argument("--disk-gb", type=int, help=f"VM storage in GB (default {DEFAULT_HOST['disk_gb']}, env LUDUS_HOST_DISK_GB)")
+    parser.add_argument("--apply", action="store_true", help="Write the recommended full_clone value into the config")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    host = {k: v for k, v in (("cpus", args.cpus), ("ram_gb", args.ram_gb), ("disk_gb", args.disk_gb)) if v}
+    if args.apply:
+        changed = apply_clone_recommendations(config)
+        with open(args.config, "w") as f:
+            yaml.safe_dump(config, f, default_flow_style=False, sort_keys=False, indent=2)
+        print(f"Updated full_clone on {changed} VM(s) in {args.config}")
+
+    report = plan(config, host)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_plan(report)
+    sys.exit(1 if report["warnings"] else 0)
+
+if __name__ == "__main__":
+    main()
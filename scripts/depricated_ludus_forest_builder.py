@@ -5,6 +5,19 @@ import sys
 import subprocess
 import os
 import re
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ludus_cache import CACHE_DIR, cache_path
+from ludus_client import LudusError, list_templates, list_roles
+from ludus_prefetch import Prefetch
+from ludus_watch import fetch_range, watch_deployment
+from ip_allocator import IPAllocator, AllocationError
+from range_diff import deploy_changes, fetch_applied_config
+from range_snapshots import TierCheckpointer, restore_checkpoint, CHECKPOINT_RE
+from capacity_plan import DEFAULT_HOST, plan, print_plan, apply_clone_recommendations
 
 # --- Helper Functions for System Interaction ---
 
@@ -27,16 +40,79 @@ def run_command(command, use_shell=False):
         print("Please ensure Ludus is installed and in your system's PATH.", file=sys.stderr)
         sys.exit(1)
 
+# --- Role Discovery ---
+
+ROLE_INDEX_PATH = os.path.join(CACHE_DIR, "role-index.json")
+ROLE_SEARCH_MAX_DEPTH = 6
+# Directories never worth descending into when looking for roles.
+ROLE_SEARCH_PRUNE = {".ansible", "galaxy_storage", ".git", ".cache", "node_modules",
+                     "__pycache__", "venv", ".venv"}
+
+def role_stamp(path):
+    """Returns the newest mtime of a role dir and its tasks/meta entry points, or None if it is not a role."""
+    try:
+        return max(os.stat(p).st_mtime for p in (path,
+                                                 os.path.join(path, "tasks", "main.yml"),
+                                                 os.path.join(path, "meta", "main.yml")))
+    except OSError:
+        return None
+
+def build_role_index(search_paths):
+    """Walks the search paths once and returns {role_name: {'path', 'mtime'}} for every ludus_* role found."""
+    index = {}
+    roots = [os.path.abspath(p) for p in search_paths]
+    for n, root in enumerate(roots):
+        if root in roots[:n]:
+            continue
+        # Subtrees of earlier roots have already been indexed.
+        skip = {r for r in roots[:n] if r != root and r.startswith(root + os.sep)}
+        base_depth = root.rstrip(os.sep).count(os.sep)
+        for dirpath, dirs, _ in os.walk(root):
+            keep = []
+            for d in dirs:
+                full = os.path.join(dirpath, d)
+                if d in ROLE_SEARCH_PRUNE or d.startswith('.') or full in skip:
+                    continue
+                if d.startswith("ludus_"):
+                    stamp = role_stamp(full)
+                    if stamp is not None:
+                        index.setdefault(d, {'path': full, 'mtime': stamp})
+                        continue  # a role never contains other roles
+                keep.append(d)
+            dirs[:] = keep if dirpath.count(os.sep) - base_depth < ROLE_SEARCH_MAX_DEPTH else []
+    return index
+
+def locate_roles(role_names, search=True):
+    """
+    Resolves role names to directories using a persisted index.
+
+    The index is rebuilt (one pruned traversal of '.' and ~) only when a
+    requested role is missing from it or its recorded mtime no longer matches.
+    With search=False it is never rebuilt; unknown or stale roles map to None.
+    """
+    try:
+        with open(ROLE_INDEX_PATH) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    def fresh(name):
+        entry = index.get(name)
+        return entry is not None and role_stamp(entry['path']) == entry['mtime']
+
+    if not search:
+        return {name: index[name]['path'] if fresh(name) else None for name in role_names}
+    if not all(fresh(name) for name in role_names):
+        index = build_role_index(['.', os.path.expanduser("~")])
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(ROLE_INDEX_PATH, 'w') as f:
+            json.dump(index, f)
+
+    return {name: index[name]['path'] if name in index else None for name in role_names}
+
 def find_role_path(role_name):
     """Searches for a role directory in common locations."""
-    search_paths = [os.path.expanduser("~"), '.']
-    for path in search_paths:
-        for root, dirs, files in os.walk(path):
-            if role_name in dirs:
-                if ".ansible" in root or "galaxy_storage" in root:
-                    continue
-                return os.path.join(root, role_name)
-    return None
+    return locate_roles([role_name])[role_name]
 
 # --- Helper Functions for User Input ---
 
@@ -85,69 +161,203 @@ def get_yes_no(prompt, default='n'):
             return False
         print("Invalid input. Please enter 'y' or 'n'.", file=sys.stderr)
 
-def select_template(available_templates):
-    """Displays a list of templates and gets user selection."""
+# Templates derived with the ludus_prestage_adds role carry this marker.
+ADDS_TEMPLATE_MARKER = "-adds-"
+
+def select_template(available_templates, prefer=None):
+    """Displays a list of templates and gets user selection (defaulting to the first one containing `prefer`)."""
     print("\nPlease select a VM template:")
     for i, t in enumerate(available_templates, 1):
         print(f"  {i}) {t}")
 
-    choice = get_int_input("Enter template number", default=1, min_val=1, max_val=len(available_templates))
+    default = next((i for i, t in enumerate(available_templates, 1) if prefer and prefer in t), 1)
+    choice = get_int_input("Enter template number", default=default, min_val=1, max_val=len(available_templates))
     return available_templates[choice - 1]
 
+def get_octet_input(prompt, allocator, vlan, role, owner):
+    """Prompts for a last octet (default: next free one for the role) and claims it, re-prompting on collisions."""
+    while True:
+        octet = get_int_input(prompt, allocator.next_free(vlan, role), min_val=1, max_val=254)
+        try:
+            return allocator.claim(vlan, octet, owner)
+        except AllocationError as e:
+            print(f"{e}. Please choose another.", file=sys.stderr)
+
 # --- Core Logic Functions ---
 
-def get_available_templates():
+# --- Background Lookups ---
+
+# Range states in which starting another deploy would race the running one.
+BUSY_STATES = {"DEPLOYING", "WAITING"}
+# The range status is looked up again if it is older than this when a deploy is offered.
+STATUS_MAX_AGE = 30
+
+def fetch_templates():
+    """Lists the built Ludus templates (runs in the background)."""
+    return [t.name for t in list_templates() if t.built]
+
+def fetch_installed_roles():
+    """Lists the ludus_* roles installed on the server (runs in the background)."""
+    return [r.name for r in list_roles() if r.type == "role" and r.name.startswith("ludus_")]
+
+def start_prefetch():
+    """Starts every Ludus lookup the prompts will need, so none of them blocks the first prompt."""
+    prefetch = Prefetch()
+    prefetch.start("templates", fetch_templates)
+    prefetch.start("installed_roles", fetch_installed_roles)
+    # Only the persisted index unless a sync is requested; missing roles trigger a full search later.
+    prefetch.start("role_paths", locate_roles, REQUIRED_ROLES, ROLE_SYNC_REQUESTED)
+    prefetch.start("applied_config", fetch_applied_config)
+    prefetch.start("status", fetch_range)
+    return prefetch
+
+def get_available_templates(prefetch):
     """Dynamically gets available Ludus templates."""
-    print("Fetching available Ludus templates...")
-    command_to_run = "ludus templates list | grep TRUE | awk '{print $2}'"
-    output = run_command(command_to_run, use_shell=True)
-
-    templates = [line for line in output.strip().split('\n') if line]
+    try:
+        templates = prefetch.get("templates", "the Ludus template list")
+    except LudusError as e:
+        print(f"Error: could not list the Ludus templates: {e}", file=sys.stderr)
+        sys.exit(1)
 
     if not templates:
         print("Could not find any built templates from 'ludus templates list'.", file=sys.stderr)
         print("Please ensure you have at least one built template.", file=sys.stderr)
         sys.exit(1)
-    print("Templates successfully fetched.")
     return templates
 
-def verify_and_install_roles():
-    """Checks for required roles and installs them if missing."""
+REQUIRED_ROLES = [
+    "ludus_verify_dc_ready",
+    "ludus_create_child_domain",
+    "ludus_secondary_child_dc",
+    "ludus_prep_child_member",
+    "ludus_join_child_domain"
+]
+
+# Concurrent `ludus ansible role add` uploads; same variable as install_forest_build_roles.sh.
+ROLE_SYNC_WORKERS = max(1, int(os.environ.get("LUDUS_ROLE_SYNC_JOBS", 4)))
+# LUDUS_ROLE_SYNC=1 searches for local copies of the roles even when all are installed.
+ROLE_SYNC_REQUESTED = os.environ.get("LUDUS_ROLE_SYNC") == "1"
+
+def role_content_hash(path):
+    """
+    Hashes every file in a role directory.
+
+    Equivalent to `find . -type f | LC_ALL=C sort | xargs sha256sum | sha256sum`
+    run inside the role, which is what install_forest_build_roles.sh records.
+    """
+    entries = []
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(dirpath, name)
+            rel = "./" + os.path.relpath(full, path).replace(os.sep, "/")
+            with open(full, 'rb') as f:
+                entries.append((rel.encode(), f"{hashlib.sha256(f.read()).hexdigest()}  {rel}\n"))
+    entries.sort()
+    return hashlib.sha256("".join(line for _, line in entries).encode()).hexdigest()
+
+def load_role_hashes(path):
+    """Reads the `<hash>  <role>` lines recorded for previously pushed roles."""
+    hashes = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    hashes[parts[1]] = parts[0]
+    except OSError:
+        pass
+    return hashes
+
+def save_role_hashes(path, hashes):
+    """Writes the recorded role hashes back to disk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for role, digest in sorted(hashes.items()):
+            f.write(f"{digest}  {role}\n")
+
+def push_role(role, path, update):
+    """Uploads a role with `ludus ansible role add`; returns (role, error or None, seconds)."""
+    command = ["ludus", "ansible", "role", "add", "-d", path] + (["--force"] if update else [])
+    start = time.monotonic()
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
+        error = None
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.strip() or f"exit status {e.returncode}"
+    except FileNotFoundError:
+        error = "the 'ludus' command was not found"
+    return role, error, time.monotonic() - start
+
+def sync_roles(role_paths, installed_roles):
+    """
+    Pushes the local roles whose content differs from what was last installed.
+
+    Returns the names of roles that failed to upload.
+    """
+    state_path = cache_path("installed-roles", "sha256")
+    recorded = load_role_hashes(state_path)
+    hashes = {role: role_content_hash(path) for role, path in role_paths.items()}
+    pending = [role for role in role_paths
+               if role not in installed_roles or recorded.get(role) != hashes[role]]
+
+    for role in role_paths:
+        if role not in pending:
+            print(f"  {role:<28} up to date")
+    if not pending:
+        return []
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(ROLE_SYNC_WORKERS, len(pending))) as pool:
+        futures = [pool.submit(push_role, role, role_paths[role], role in installed_roles) for role in pending]
+        for future in futures:
+            results.append(future.result())
+
+    failed = []
+    for role, error, seconds in results:
+        if error:
+            failed.append(role)
+            print(f"  {role:<28} FAILED     {seconds:6.1f}s  {error}", file=sys.stderr)
+        else:
+            recorded[role] = hashes[role]
+            print(f"  {role:<28} {'updated' if role in installed_roles else 'installed':<10} {seconds:6.1f}s")
+    save_role_hashes(state_path, recorded)
+    return failed
+
+def verify_and_install_roles(prefetch):
+    """Checks the required roles and installs any that are missing or out of date."""
     print_header("Verifying Ansible Roles")
-    required_roles = [
-        "ludus_verify_dc_ready",
-        "ludus_create_child_domain",
-        "ludus_secondary_child_dc",
-        "ludus_join_child_domain"
-    ]
-
-    print("Checking for installed roles...")
-    # CORRECTED: Use the robust bash pipeline provided by the user.
-    command_to_run = "ludus ansible role list | grep ludus_ | awk '{print $2}'"
-    installed_output = run_command(command_to_run, use_shell=True)
-    installed_roles = [role.strip() for role in installed_output.strip().split('\n') if role]
-
-    missing_roles = [role for role in required_roles if role not in installed_roles]
-
-    if not missing_roles:
+
+    try:
+        installed_roles = prefetch.get("installed_roles", "the installed role list")
+    except LudusError as e:
+        print(f"Error: could not list the installed Ansible roles: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    missing_roles = [role for role in REQUIRED_ROLES if role not in installed_roles]
+    role_paths = prefetch.get("role_paths", "the local role search")
+    if not missing_roles and not any(role_paths.values()):
+        # Installed, and no local copy is known: nothing to sync.
         print("All required roles are already installed.")
         return
+    if any(not role_paths[role] for role in missing_roles):
+        role_paths = locate_roles(REQUIRED_ROLES)
+    unresolved = [role for role in REQUIRED_ROLES if not role_paths[role] and role not in installed_roles]
+    if unresolved:
+        for role in unresolved:
+            print(f"Error: Could not find directory for role '{role}'.", file=sys.stderr)
+        print("Please ensure the ludus_forest_build_roles repository is cloned in your home directory or the current directory.", file=sys.stderr)
+        sys.exit(1)
 
-    print(f"Missing roles found: {', '.join(missing_roles)}")
-    if get_yes_no("Attempt to find and install them?", 'y'):
-        for role in missing_roles:
-            print(f"Searching for role '{role}'...")
-            role_path = find_role_path(role)
-            if role_path:
-                print(f"Found at '{role_path}'. Installing...")
-                run_command(f"ludus ansible role add -d {role_path}")
-                print(f"Successfully installed '{role}'.")
-            else:
-                print(f"Error: Could not find directory for role '{role}'.", file=sys.stderr)
-                print("Please ensure the ludus_forest_build_roles repository is cloned in your home directory or the current directory.", file=sys.stderr)
-                sys.exit(1)
-    else:
-        print("Cannot proceed without required roles. Exiting.", file=sys.stderr)
+    local_roles = {role: path for role, path in role_paths.items() if path}
+    if missing_roles:
+        print(f"Missing roles found: {', '.join(missing_roles)}")
+        if not get_yes_no("Attempt to find and install them?", 'y'):
+            print("Cannot proceed without required roles. Exiting.", file=sys.stderr)
+            sys.exit(1)
+
+    print("Syncing roles...")
+    if sync_roles(local_roles, installed_roles):
+        print("Some roles could not be installed. Exiting.", file=sys.stderr)
         sys.exit(1)
 
 def get_default_settings():
@@ -184,7 +394,7 @@ def get_default_settings():
     defaults['enable_dynamic_wallpaper'] = True
     return defaults
 
-def define_parent_domain(range_id, use_full_clones, templates):
+def define_parent_domain(range_id, use_full_clones, templates, allocator):
     """Gathers details for the parent domain and its machines."""
     print_header("Parent Domain Configuration")
     vms = []
@@ -196,11 +406,11 @@ def define_parent_domain(range_id, use_full_clones, templates):
     # Primary DC
     print("\n--- Parent Primary DC ---")
     pdc_hostname = get_input("Primary DC Hostname", f"{netbios}-DC1")
-    pdc_ip_octet = get_int_input("Primary DC IP Last Octet", 10)
+    pdc_ip_octet = get_octet_input("Primary DC IP Last Octet", allocator, vlan, "dc", pdc_hostname)
     pdc_vm = {
         'vm_name': f"{{{{ range_id }}}}-{pdc_hostname}",
         'hostname': pdc_hostname,
-        'template': select_template(templates),
+        'template': select_template(templates, ADDS_TEMPLATE_MARKER),
         'vlan': vlan,
         'ip_last_octet': pdc_ip_octet,
         'ram_gb': get_int_input("RAM (GB)", 4),
@@ -217,11 +427,11 @@ def define_parent_domain(range_id, use_full_clones, templates):
     for i in range(num_secondary_dcs):
         print(f"\n--- Parent Secondary DC #{i+1} ---")
         sdc_hostname = get_input("Secondary DC Hostname", f"{netbios}-DC{i+2}")
-        sdc_ip_octet = get_int_input("Secondary DC IP Last Octet", 11 + i)
+        sdc_ip_octet = get_octet_input("Secondary DC IP Last Octet", allocator, vlan, "dc", sdc_hostname)
         sdc_vm = {
             'vm_name': f"{{{{ range_id }}}}-{sdc_hostname}",
             'hostname': sdc_hostname,
-            'template': select_template(templates),
+            'template': select_template(templates, ADDS_TEMPLATE_MARKER),
             'vlan': vlan,
             'ip_last_octet': sdc_ip_octet,
             'ram_gb': get_int_input("RAM (GB)", 4),
@@ -234,7 +444,7 @@ def define_parent_domain(range_id, use_full_clones, templates):
 
     return vms, fqdn, netbios, {'vlan': vlan, 'octet': pdc_ip_octet, 'hostname': pdc_hostname}
 
-def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, use_full_clones, templates):
+def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, use_full_clones, templates, allocator):
     """Gathers details for a single child domain and its machines."""
     vms = []
 
@@ -245,17 +455,17 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, u
 
     child_fqdn = f"{child_name.lower()}.{parent_fqdn}"
     child_netbios = get_input("Child Domain NETBIOS Name", child_name.upper())
-    child_vlan = get_int_input(f"VLAN for {child_fqdn}", 20)
+    child_vlan = get_int_input(f"VLAN for {child_fqdn}", allocator.next_vlan())
 
     # Child Primary DC
     print(f"\n--- {child_netbios} Primary DC ---")
     pdc_hostname = get_input("Primary DC Hostname", f"{child_netbios}-DC1")
-    pdc_ip_octet = get_int_input("Primary DC IP Last Octet", 10)
+    pdc_ip_octet = get_octet_input("Primary DC IP Last Octet", allocator, child_vlan, "dc", pdc_hostname)
 
     pdc_vm = {
         'vm_name': f"{{{{ range_id }}}}-{pdc_hostname}",
         'hostname': pdc_hostname,
-        'template': select_template(templates),
+        'template': select_template(templates, ADDS_TEMPLATE_MARKER),
         'vlan': child_vlan,
         'ip_last_octet': pdc_ip_octet,
         'ram_gb': get_int_input("RAM (GB)", 4),
@@ -263,20 +473,21 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, u
         'full_clone': use_full_clones,
         'windows': {'sysprep': True},
         'roles': [{'name': 'ludus_create_child_domain', 'depends_on': [{'vm_name': f"{{{{ range_id }}}}-{parent_dc_info['hostname']}", 'role': 'ludus_verify_dc_ready'}]}],
-        'role_vars': {'dns_domain_name': child_fqdn, 'parent_domain_netbios_name': parent_netbios, 'parent_dc_ip': f"10.2.{parent_dc_info['vlan']}.{parent_dc_info['octet']}"}
+        'role_vars': {'new_child_fqdn': child_fqdn, 'parent_domain_netbios_name': parent_netbios, 'parent_dc_ip': f"10.2.{parent_dc_info['vlan']}.{parent_dc_info['octet']}"}
     }
     vms.append(pdc_vm)
 
     # Optional Secondary DC
     num_secondary_dcs = get_int_input(f"How many secondary DCs for {child_netbios}?", 0)
+    use_ifm = num_secondary_dcs > 0 and get_yes_no("Seed them from IFM media of the primary DC instead of network replication?")
     for i in range(num_secondary_dcs):
         print(f"\n--- {child_netbios} Secondary DC #{i+1} ---")
         sdc_hostname = get_input("Secondary DC Hostname", f"{child_netbios}-DC{i+2}")
-        sdc_ip_octet = get_int_input("Secondary DC IP Last Octet", 11 + i)
+        sdc_ip_octet = get_octet_input("Secondary DC IP Last Octet", allocator, child_vlan, "dc", sdc_hostname)
         sdc_vm = {
             'vm_name': f"{{{{ range_id }}}}-{sdc_hostname}",
             'hostname': sdc_hostname,
-            'template': select_template(templates),
+            'template': select_template(templates, ADDS_TEMPLATE_MARKER),
             'vlan': child_vlan,
             'ip_last_octet': sdc_ip_octet,
             'ram_gb': get_int_input("RAM (GB)", 4),
@@ -286,6 +497,8 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, u
             'roles': [{'name': 'ludus_secondary_child_dc', 'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]}],
             'role_vars': {'dns_domain_name': child_fqdn, 'parent_domain_netbios_name': parent_netbios, 'existing_dc_ip': f"10.2.{child_vlan}.{pdc_ip_octet}"}
         }
+        if use_ifm:
+            sdc_vm['role_vars'].update({'ifm_enabled': True, 'ifm_source_host': pdc_vm['vm_name']})
         vms.append(sdc_vm)
 
     # Child Members
@@ -293,7 +506,7 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, u
     for i in range(num_members):
         print(f"\n--- {child_netbios} Member #{i+1} ---")
         mem_hostname = get_input("Member Hostname", f"{child_netbios}-WKS{i+1}")
-        mem_ip_octet = get_int_input("Member IP Last Octet", 100 + i)
+        mem_ip_octet = get_octet_input("Member IP Last Octet", allocator, child_vlan, "workstation", mem_hostname)
 
         mem_vm = {
             'vm_name': f"{{{{ range_id }}}}-{mem_hostname}",
@@ -305,14 +518,14 @@ def define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, u
             'cpus': get_int_input("CPUs", 2),
             'full_clone': use_full_clones,
             'windows': {'sysprep': True},
-            'roles': [{'name': 'ludus_join_child_domain', 'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]}],
+            'roles': ['ludus_prep_child_member', {'name': 'ludus_join_child_domain', 'depends_on': [{'vm_name': pdc_vm['vm_name'], 'role': 'ludus_create_child_domain'}]}],
             'role_vars': {'dc_ip': f"10.2.{child_vlan}.{pdc_ip_octet}", 'dns_domain_name': child_fqdn, 'child_domain_netbios_name': child_netbios}
         }
         vms.append(mem_vm)
 
     return vms
 
-def define_standalone_vms(range_id, use_full_clones, templates):
+def define_standalone_vms(range_id, use_full_clones, templates, allocator):
     """Gathers details for non-domain-joined machines."""
     vms = []
     num_standalone = get_int_input("\nHow many non-domain-joined machines?", 0)
@@ -320,7 +533,7 @@ def define_standalone_vms(range_id, use_full_clones, templates):
         print_header(f"Standalone VM #{i+1}")
         hostname = get_input("Hostname")
         vlan = get_int_input("VLAN")
-        ip_octet = get_int_input("IP Last Octet")
+        ip_octet = get_octet_input("IP Last Octet", allocator, vlan, None, hostname)
         template = select_template(templates)
         is_linux = 'linux' in template or 'ubuntu' in template or 'kali' in template
 
@@ -341,10 +554,18 @@ def define_standalone_vms(range_id, use_full_clones, templates):
         vms.append(vm)
     return vms
 
+def confirm_range_idle(prefetch):
+    """Asks before deploying over a range that is already being deployed."""
+    status = prefetch.get("status", "the range status", max_age=STATUS_MAX_AGE)
+    if status is None or status['state'] not in BUSY_STATES:
+        return True
+    return get_yes_no(f"The range is currently {status['state']}. Deploy anyway?", 'n')
+
 # --- Main Execution ---
 
 def main():
     """Main function to drive the configuration script."""
+    prefetch = start_prefetch()
     print_header("Ludus Forest Build Roles Config Generator")
     print("This script will guide you through creating a ludus-config.yml file.")
 
@@ -352,11 +573,13 @@ def main():
     range_id = get_input("Enter your Ludus Range ID (e.g., MH)", "MH")
     use_full_clones = get_yes_no("Use full clones instead of linked clones? (slower but independent)", 'n')
 
-    available_templates = get_available_templates()
-    verify_and_install_roles()
+    verify_and_install_roles(prefetch)
 
+    allocator = IPAllocator()
+    defaults = get_default_settings()
+    available_templates = get_available_templates(prefetch)
     config = {
-        'defaults': get_default_settings(),
+        'defaults': defaults,
         'network': {
             'inter_vlan_default': 'ACCEPT',
             'external_default': 'ACCEPT'
@@ -365,20 +588,32 @@ def main():
     }
 
     # Parent Domain
-    parent_vms, parent_fqdn, parent_netbios, parent_dc_info = define_parent_domain(range_id, use_full_clones, available_templates)
+    parent_vms, parent_fqdn, parent_netbios, parent_dc_info = define_parent_domain(range_id, use_full_clones, available_templates, allocator)
     config['ludus'].extend(parent_vms)
 
     # Child Domains
     num_child_domains = get_int_input("\nHow many child domains do you want to create?", 0)
     for i in range(num_child_domains):
         print_header(f"Child Domain #{i+1}")
-        child_vms = define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, use_full_clones, available_templates)
+        child_vms = define_child_domain(range_id, parent_fqdn, parent_netbios, parent_dc_info, use_full_clones, available_templates, allocator)
         config['ludus'].extend(child_vms)
 
     # Standalone Machines
-    standalone_vms = define_standalone_vms(range_id, use_full_clones, available_templates)
+    standalone_vms = define_standalone_vms(range_id, use_full_clones, available_templates, allocator)
     config['ludus'].extend(standalone_vms)
 
+    # Capacity Planning
+    print_header("Capacity Plan")
+    host = {
+        'cpus': get_int_input("Host CPU cores", DEFAULT_HOST['cpus'], min_val=1),
+        'ram_gb': get_int_input("Host RAM (GB)", DEFAULT_HOST['ram_gb'], min_val=1),
+        'disk_gb': get_int_input("Host VM storage (GB)", DEFAULT_HOST['disk_gb'], min_val=1)
+    }
+    report = plan(config, host)
+    print_plan(report)
+    if report['clone_changes'] and get_yes_no("Apply the recommended clone type per VM (DCs full, others linked)?", 'y'):
+        apply_clone_recommendations(config)
+
     # Save the configuration to a YAML file
     with open(output_filename, 'w') as f:
         def str_presenter(dumper, data):
@@ -392,31 +627,49 @@ def main():
     print("\n" + "="*60)
     print(f"Success! Configuration written to {output_filename}".center(60))
     print("="*60)
+    allocator.print_report()
 
     # Post-creation actions
     while True:
         print("\nWhat would you like to do next?")
         print("  1) Set the config for the current range")
         print("  2) Set and DEPLOY the config for the current range")
-        print("  3) Exit")
-        choice = get_int_input("Enter your choice", 3)
+        print("  3) Set the config and deploy only what changed (diff against the applied config)")
+        print("  4) Restore the range (or one child domain) to a snapshot checkpoint")
+        print("  5) Exit")
+        choice = get_int_input("Enter your choice", 5)
 
         if choice == 1:
             print(f"Running: ludus range config set -f {output_filename}")
             run_command(f"ludus range config set -f {output_filename}")
             print("Configuration set successfully.")
             break
+        elif choice in (2, 3) and not confirm_range_idle(prefetch):
+            continue
         elif choice == 2:
             print(f"Running: ludus range config set -f {output_filename}")
             run_command(f"ludus range config set -f {output_filename}")
-            print("Configuration set. Starting deployment...")
-            # Using os.system for interactive commands like deploy and watch
-            os.system("ludus range deploy")
-            print("\nDeployment command finished. Starting status watch...")
-            print("Press Ctrl+C to exit watch.")
-            os.system(f"watch -c 'ludus range list'")
-            break
+            print("Configuration set.")
+            checkpointer = None
+            if get_yes_no("Snapshot each tier (checkpoint 'baseline') as the deploy finishes it, for fast resets?", 'y'):
+                checkpointer = TierCheckpointer(config, "baseline", range_id)
+            print("Starting deployment...")
+            run_command("ludus range deploy")
+            print("\nDeployment started. Watching for state changes (Ctrl+C to stop)...")
+            code = watch_deployment(on_poll=checkpointer)
+            if code == 0 and checkpointer:
+                code = checkpointer.finish()
+            sys.exit(code)
         elif choice == 3:
+            sys.exit(deploy_changes(config, output_filename, range_id, prefetch.get("applied_config", "the applied range config")))
+        elif choice == 4:
+            checkpoint = get_input("Checkpoint name", "baseline")
+            if not CHECKPOINT_RE.match(checkpoint):
+                print("Invalid checkpoint name.", file=sys.stderr)
+                continue
+            domain = get_input("Only this domain FQDN (blank for the whole range)", "")
+            sys.exit(restore_checkpoint(config, checkpoint, range_id, domain or None))
+        elif choice == 5:
             print("Exiting.")
             break
         else:
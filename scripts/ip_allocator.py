@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ip_allocator.py
+
+Per-VLAN address allocator for the range generators:
+- One 256-bit bitmap per VLAN (bit n set = 10.2.<vlan>.n taken)
+- Role ranges keep DCs, servers, workstations and attacker/infra hosts
+  apart; .1-.9 (gateway side) and .254 (Ludus router) are never handed out
+- Lowest free octet in a range is found with a couple of integer ops
+  (no scanning), explicit octets are checked the moment they are claimed
+- Utilization report per VLAN and role range
+
+Usage:
+    python3 ip_allocator.py ludus-config.yml     # audit an existing config
+"""
+
+import sys
+import yaml
+
+# Inclusive last-octet ranges handed out per role.
+ROLE_RANGES = {
+    "dc": (10, 19),
+    "server": (20, 99),
+    "workstation": (100, 199),
+    "infra": (200, 250),
+}
+ROLE_RANGES["attacker"] = ROLE_RANGES["infra"]
+
+# Gateway-side low addresses and the Ludus router at .254 (.0/.255 are
+# outside 1-254 anyway).
+RESERVED = list(range(1, 10)) + [254]
+
+def range_mask(first, last):
+    """Bitmask with bits first..last (inclusive) set."""
+    return ((1 << (last - first + 1)) - 1) << first
+
+RESERVED_MASK = sum(1 << octet for octet in RESERVED)
+ASSIGNABLE_MASK = range_mask(1, 254) & ~RESERVED_MASK
+ROLE_MASKS = {role: range_mask(*bounds) for role, bounds in ROLE_RANGES.items()}
+
+class AllocationError(ValueError):
+    """Raised when an address is taken, reserved or a role range is full."""
+
+class IPAllocator:
+    """Tracks which 10.2.<vlan>.<octet> addresses a generated range uses."""
+
+    def __init__(self):
+        self.used = {}     # vlan -> int bitmap
+        self.owners = {}   # (vlan, octet) -> vm name, for error messages
+
+    def is_free(self, vlan, octet):
+        return not (self.used.get(vlan, 0) >> octet) & 1
+
+    def next_free(self, vlan, role=None):
+        """Lowest free octet in the role's range (any assignable octet if role is None), or None."""
+        mask = ROLE_MASKS[role] if role else ASSIGNABLE_MASK
+        free = mask & ~self.used.get(vlan, 0)
+        return (free & -free).bit_length() - 1 if free else None
+
+    def claim(self, vlan, octet, owner):
+        """Mark an explicitly chosen octet as used; raises AllocationError on a collision."""
+        if not 1 <= octet <= 254:
+            raise AllocationError(f"{owner}: last octet {octet} is outside 1-254")
+        if (RESERVED_MASK >> octet) & 1:
+            raise AllocationError(f"{owner}: 10.2.{vlan}.{octet} is reserved")
+        if not self.is_free(vlan, octet):
+            raise AllocationError(f"{owner}: 10.2.{vlan}.{octet} is already used by {self.owners[(vlan, octet)]}")
+        self.used[vlan] = self.used.get(vlan, 0) | (1 << octet)
+        self.owners[(vlan, octet)] = owner
+        return octet
+
+    def release(self, vlan, octet):
+        """Free a claimed octet again (e.g. to roll back a batch that failed part-way)."""
+        self.used[vlan] = self.used.get(vlan, 0) & ~(1 << octet)
+        self.owners.pop((vlan, octet), None)
+
+    def allocate(self, vlan, role, owner):
+        """Claim and return the lowest free octet in the role's range."""
+        octet = self.next_free(vlan, role)
+        if octet is None:
+            first, last = ROLE_RANGES[role]
+            raise AllocationError(f"{owner}: no free {role} address left in 10.2.{vlan}.{first}-{last}")
+        return self.claim(vlan, octet, owner)
+
+    def next_vlan(self, start=20, step=10, exclude=()):
+        """First VLAN in start, start+step, ... with nothing allocated on it and not in exclude."""
+        vlan = start
+        while self.used.get(vlan) or vlan in exclude:
+            vlan += step
+        return vlan
+
+    def utilization(self):
+        """{vlan: {'used': n, 'free': n, 'roles': {role: (used, size)}}}"""
+        report = {}
+        for vlan, bits in sorted(self.used.items()):
+            roles = {}
+            for role, (first, last) in ROLE_RANGES.items():
+                if role != "attacker":
+                    roles[role] = (bin(bits & ROLE_MASKS[role]).count("1"), last - first + 1)
+            used = bin(bits).count("1")
+            report[vlan] = {"used": used, "free": bin(ASSIGNABLE_MASK).count("1") - used, "roles": roles}
+        return report
+
+    def print_report(self, out=sys.stdout):
+        print(f"\n{'VLAN':>6} {'used':>6} {'free':>6}  " + "  ".join(f"{role:>12}" for role in ROLE_RANGES if role != "attacker"),
+              file=out)
+        for vlan, entry in self.utilization().items():
+            cells = "  ".join(f"{f'{used}/{size}':>12}" for used, size in entry["roles"].values())
+            print(f"{vlan:>6} {entry['used']:>6} {entry['free']:>6}  {cells}", file=out)
+
+def audit_config(config):
+    """Claims every VM of a loaded ludus config; returns (allocator, [collision messages])."""
+    allocator, errors = IPAllocator(), []
+    for vm in config.get("ludus") or []:
+        try:
+            allocator.claim(vm.get("vlan"), vm.get("ip_last_octet"), vm.get("vm_name") or vm.get("hostname"))
+        except (AllocationError, TypeError) as e:
+            errors.append(str(e) if isinstance(e, AllocationError) else f"{vm.get('vm_name')}: missing vlan/ip_last_octet")
+    return allocator, errors
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <ludus-config.yml>", file=sys.stderr)
+        sys.exit(1)
+    try:
+        with open(sys.argv[1]) as f:
+            config = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    allocator, errors = audit_config(config)
+    allocator.print_report()
+    for error in errors:
+        print(f"✗ {error}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
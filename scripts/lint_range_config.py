@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+lint_range_config.py
+
+Catches broken range configs before a deploy does, in one pass over the
+VM list:
+- Duplicate vm_name, hostname and IP (10.2.<vlan>.<octet>) entries
+- depends_on pointing at a missing VM or a role that VM doesn't run, and
+  dependency cycles (via analyze_range.py)
+- *_ip role variables (parent_dc_ip, existing_dc_ip, dc_ip) that don't
+  resolve to a DC of the right domain
+- Role variables required by the `assert: that: - X is defined` checks in
+  each local role's tasks/main.yml that nothing in the config provides
+
+Usage:
+    python3 lint_range_config.py generated-config.yml [--roles-path DIR ...] [--json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+import yaml
+
+from analyze_range import load_config, vm_roles, build_graph, find_cycles, node_label
+from ip_allocator import IPAllocator, AllocationError
+
+# Roles are looked up next to this repo's scripts/ directory by default.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFINED_RE = re.compile(r"^\s*(\w+)\s+is\s+defined\s*$")
+IP_RE = re.compile(r"^\d+\.\d+\.(\d+)\.(\d+)$")
+
+# Roles that create or extend a domain; their VM is a DC of that domain
+# even though Ludus itself doesn't set domain.role for it.
+DC_ROLES = {
+    "ludus_create_child_domain": "primary-dc",
+    "ludus_secondary_child_dc": "alt-dc",
+}
+
+# role variable -> which DC of which domain it must point at
+IP_VARS = {
+    "parent_dc_ip": "parent",
+    "existing_dc_ip": "same",
+    "dc_ip": "same",
+}
+
+# --------------------------------------------------------------------------
+# Role requirements
+# --------------------------------------------------------------------------
+
+def iter_tasks(tasks):
+    """Yield every task, descending into block/rescue/always sections."""
+    for task in tasks or []:
+        if not isinstance(task, dict):
+            continue
+        yield task
+        for section in ("block", "rescue", "always"):
+            yield from iter_tasks(task.get(section))
+
+def load_yaml_file(path):
+    try:
+        with open(path) as f:
+            return yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return None
+
+def role_requirements(role_dir):
+    """Return (required vars, vars the role defines itself) for a role directory."""
+    required = set()
+    for task in iter_tasks(load_yaml_file(os.path.join(role_dir, "tasks", "main.yml"))):
+        check = task.get("assert") or task.get("ansible.builtin.assert")
+        if not isinstance(check, dict):
+            continue
+        that = check.get("that") or []
+        for condition in [that] if isinstance(that, str) else that:
+            match = DEFINED_RE.match(str(condition))
+            if match:
+                required.add(match.group(1))
+    provided = set()
+    for sub in ("defaults", "vars"):
+        data = load_yaml_file(os.path.join(role_dir, sub, "main.yml"))
+        if isinstance(data, dict):
+            provided.update(data)
+    return required, provided
+
+class RoleCatalog:
+    """Resolves role names to local role directories, parsing each role once."""
+
+    def __init__(self, search_paths):
+        self.search_paths = search_paths
+        self.cache = {}
+
+    def get(self, role):
+        if role not in self.cache:
+            self.cache[role] = None
+            for base in self.search_paths:
+                role_dir = os.path.join(base, role)
+                if os.path.isfile(os.path.join(role_dir, "tasks", "main.yml")):
+                    self.cache[role] = role_requirements(role_dir)
+                    break
+        return self.cache[role]
+
+# --------------------------------------------------------------------------
+# Lint
+# --------------------------------------------------------------------------
+
+def parse_ip(value):
+    """'10.2.20.10' -> (20, 10); None for anything else (including Jinja)."""
+    match = IP_RE.match(str(value).strip())
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def vm_vars(vm, role_entry_vars):
+    """Variables a role on this VM sees from the VM itself."""
+    return {**(vm.get("role_vars") or {}), **(role_entry_vars or {})}
+
+def vm_domain(vm):
+    """(fqdn, dc_kind) of the domain this VM is a DC for, or (fqdn, None) for members."""
+    domain = vm.get("domain") or {}
+    if domain.get("role") in ("primary-dc", "alt-dc"):
+        return domain.get("fqdn"), domain.get("role")
+    role_vars = vm.get("role_vars") or {}
+    for role, _ in vm_roles(vm):
+        if role in DC_ROLES:
+            return role_vars.get("new_child_fqdn") or role_vars.get("dns_domain_name"), DC_ROLES[role]
+    return domain.get("fqdn") or role_vars.get("dns_domain_name"), None
+
+def lint(config, search_paths):
+    """Return {'errors': [...], 'warnings': [...]} for a loaded config."""
+    errors, warnings = [], []
+    vms = config["ludus"]
+    shared = {**(config.get("defaults") or {}), **(config.get("global_role_vars") or {})}
+    catalog = RoleCatalog(search_paths)
+
+    # Pass 1: indexes (vm_name, hostname, IP) with duplicate detection.
+    names, hostnames, by_ip = {}, {}, {}
+    allocator = IPAllocator()
+    for i, vm in enumerate(vms):
+        name = vm.get("vm_name")
+        label = name or f"ludus[{i}]"
+        if not name:
+            errors.append(f"{label}: missing vm_name")
+        elif name in names:
+            errors.append(f"{label}: duplicate vm_name")
+        else:
+            names[name] = vm
+        hostname = str(vm.get("hostname") or "").lower()
+        if hostname in hostnames:
+            errors.append(f"{label}: hostname '{vm.get('hostname')}' is also used by {hostnames[hostname]}")
+        elif hostname:
+            hostnames[hostname] = label
+        try:
+            allocator.claim(vm.get("vlan"), vm.get("ip_last_octet"), label)
+            by_ip[(vm.get("vlan"), vm.get("ip_last_octet"))] = vm
+        except AllocationError as e:
+            errors.append(str(e))
+        except TypeError:
+            errors.append(f"{label}: missing or non-numeric vlan/ip_last_octet")
+
+    # depends_on references and cycles.
+    _, preds, problems = build_graph(config)
+    errors.extend(problems)
+    errors.extend(f"dependency cycle: {' -> '.join(node_label(n) for n in cycle)}" for cycle in find_cycles(preds))
+
+    # Pass 2: per-role variables.
+    for vm in vms:
+        label = vm.get("vm_name")
+        for entry in vm.get("roles") or []:
+            role = entry if isinstance(entry, str) else entry.get("name")
+            provided_here = vm_vars(vm, None if isinstance(entry, str) else entry.get("vars"))
+
+            requirements = catalog.get(role)
+            if requirements is None:
+                warnings.append(f"{label} {role}: role not found locally, required variables not checked")
+            else:
+                required, role_provided = requirements
+                missing = sorted(required - set(provided_here) - set(shared) - role_provided)
+                if missing:
+                    errors.append(f"{label} {role}: required variable(s) not set: {', '.join(missing)}")
+
+            for var, relation in IP_VARS.items():
+                if var not in provided_here:
+                    continue
+                errors.extend(check_ip_var(label, role, var, relation, provided_here, by_ip))
+
+    return {"vms": len(vms), "roles_checked": sum(1 for r in catalog.cache.values() if r),
+            "errors": errors, "warnings": warnings}
+
+def check_ip_var(label, role, var, relation, role_vars, by_ip):
+    """Verify that an *_ip role variable names a DC of the expected domain."""
+    value = role_vars[var]
+    if "{{" in str(value):
+        return []
+    target = parse_ip(value)
+    if target is None:
+        return [f"{label} {role}: {var} '{value}' is not an IPv4 address"]
+    target_vm = by_ip.get(target)
+    if target_vm is None:
+        return [f"{label} {role}: {var} {value} does not match any VM (no VM on VLAN {target[0]} with octet {target[1]})"]
+    target_fqdn, target_kind = vm_domain(target_vm)
+    if target_kind is None:
+        return [f"{label} {role}: {var} {value} is {target_vm.get('vm_name')}, which is not a domain controller"]
+
+    own_fqdn = role_vars.get("new_child_fqdn") or role_vars.get("dns_domain_name")
+    if not own_fqdn or not target_fqdn:
+        return []
+    if relation == "parent":
+        expected = own_fqdn.split(".", 1)[1] if "." in own_fqdn else None
+    else:
+        expected = own_fqdn
+    if expected and target_fqdn.lower() != expected.lower():
+        return [f"{label} {role}: {var} {value} is a DC of {target_fqdn}, expected a DC of {expected}"]
+    return []
+
+# --------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------
+
+def print_report(report, elapsed):
+    for error in report["errors"]:
+        print(f"  ✗ {error}")
+    for warning in report["warnings"]:
+        print(f"  ⚠ {warning}")
+    status = "FAILED" if report["errors"] else "OK"
+    print(f"\n{status}: {report['vms']} VMs, {report['roles_checked']} roles checked, "
+          f"{len(report['errors'])} error(s), {len(report['warnings'])} warning(s) in {elapsed * 1000:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a generated Ludus range config before deploying it.")
+    parser.add_argument("config", help="Generated ludus range config (YAML)")
+    parser.add_argument("--roles-path", action="append",
+                        help=f"Directory containing role folders (repeatable, default: {REPO_ROOT})")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    report = lint(config, args.roles_path or [REPO_ROOT])
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps({**report, "seconds": round(elapsed, 3)}, indent=2))
+    else:
+        print_report(report, elapsed)
+    sys.exit(1 if report["errors"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+ludus_cache.py
+
+Small on-disk cache shared by the range/forest builders.
+
+Entries are JSON files under ~/.cache/ludus_forest_build_roles (or
+$XDG_CACHE_HOME), keyed by the Ludus server URL and user so that switching
+servers or API keys never serves another tenant's data.
+"""
+
+import os
+import json
+import time
+import getpass
+import hashlib
+import threading
+
+import yaml
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "ludus_forest_build_roles",
+)
+LUDUS_CLI_CONFIG = os.path.expanduser("~/.config/ludus/config.yml")
+
+_cli_config = None
+_cli_config_lock = threading.Lock()
+
+
+def cli_config():
+    """The Ludus CLI's config.yml as a dict ({} if missing or unreadable), read once per process."""
+    global _cli_config
+    with _cli_config_lock:
+        if _cli_config is None:
+            try:
+                with open(LUDUS_CLI_CONFIG) as f:
+                    _cli_config = yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError):
+                _cli_config = {}
+        return _cli_config
+
+
+def ludus_identity():
+    """Return (server_url, user) for the Ludus CLI the builders shell out to."""
+    url = os.environ.get("LUDUS_URL", "") or cli_config().get("url", "") or ""
+    # Ludus API keys are "<USERID>.<secret>"; only the user ID is kept.
+    api_key = os.environ.get("LUDUS_API_KEY", "")
+    user = api_key.split(".", 1)[0] if "." in api_key else getpass.getuser()
+    return url.rstrip("/"), user
+
+
+def cache_path(kind, ext="json"):
+    """Path of the cache file for `kind` (e.g. "templates") for this Ludus identity."""
+    url, user = ludus_identity()
+    # install_forest_build_roles.sh derives the same key with sha256sum.
+    key = hashlib.sha256(f"{url}|{user}".encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{kind}-{key}.{ext}")
+
+
+def load_cache(path, ttl):
+    """Return the cached payload at `path`, or None if missing, unreadable or older than `ttl` seconds."""
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ttl is not None and time.time() - entry.get("fetched_at", 0) > ttl:
+        return None
+    return entry.get("data")
+
+
+def save_cache(path, data):
+    """Atomically write `data` to `path` with the current timestamp."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fetched_at": time.time(), "data": data}, f)
+    os.replace(tmp, path)
+
+
+def clear_cache(path):
+    """Remove a cache file if present."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+ludus_client.py
+
+Read-side Ludus API client for the builders and range tools:
+- Talks to the Ludus REST API directly (X-API-KEY header) over a small
+  pool of keep-alive connections instead of forking the CLI plus a
+  grep/awk pipeline per lookup
+- Typed results for templates, Ansible roles, the range config and the
+  range status
+- Retries connection errors and 429/502/503/504 with exponential backoff;
+  a pooled connection the server has since closed is replaced without
+  waiting
+- Records the timing of every request (API and CLI), printed with
+  --metrics or LUDUS_CLIENT_METRICS=1
+- Falls back to `ludus ... --json` when the API is not configured or not
+  reachable, so the results are the same either way
+- Remembers a failed template/role/config lookup for FAILURE_TTL seconds,
+  so later callers in the same run fail fast instead of repeating the
+  retries and the CLI fallback
+
+The server URL comes from LUDUS_URL or the CLI's ~/.config/ludus/config.yml,
+the key from LUDUS_API_KEY (the CLI keeps its own in the OS keyring).
+`verify` in the CLI config (default false, as in the CLI) enables TLS
+certificate checks. Set LUDUS_CLIENT=cli to skip the API. Any http:// URL
+works too, e.g. a local stub server for testing.
+
+Usage:
+    python3 ludus_client.py templates|roles|config|status [--json] [--cli] [--metrics]
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import subprocess
+import http.client
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from ludus_cache import cli_config, ludus_identity
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+POOL_SIZE = 4
+RETRY_STATUSES = {429, 502, 503, 504}
+# Seconds a failed lookup is answered from memory before it is tried again.
+FAILURE_TTL = 30
+
+Template = namedtuple("Template", "name built")
+Role = namedtuple("Role", "name version type is_global")
+VMStatus = namedtuple("VMStatus", "name proxmox_id powered_on ip")
+RangeStatus = namedtuple("RangeStatus", "user_id range_number state vms")
+RequestTiming = namedtuple("RequestTiming", "source method path status attempts seconds")
+
+class LudusError(Exception):
+    """A Ludus lookup failed through both the API and the CLI (or the one that was tried)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+# --------------------------------------------------------------------------
+# Parsing (shared by the API and `ludus ... --json`)
+# --------------------------------------------------------------------------
+
+def parse_templates(data):
+    return [Template(t.get("name"), bool(t.get("built"))) for t in data or []]
+
+def parse_roles(data):
+    return [Role(r.get("name"), r.get("version") or "", r.get("type") or "role", bool(r.get("global")))
+            for r in data or []]
+
+def parse_range(data):
+    # Admin keys get a list of ranges; the first one is the caller's.
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    vms = [VMStatus(vm.get("name"), vm.get("proxmoxID"), bool(vm.get("poweredOn")), vm.get("ip") or "")
+           for vm in data.get("VMs") or []]
+    return RangeStatus(data.get("userID"), data.get("rangeNumber"), data.get("rangeState", "UNKNOWN"), vms)
+
+def parse_range_config(data):
+    return data.get("result") if isinstance(data, dict) else data
+
+# --------------------------------------------------------------------------
+# API client
+# --------------------------------------------------------------------------
+
+class LudusClient:
+    """Ludus REST API client with pooled keep-alive connections, retries and timings."""
+
+    def __init__(self, url, api_key, verify=False, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff=BACKOFF_BASE, pool_size=POOL_SIZE):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) URL: {url!r}")
+        self.scheme, self.host, self.port = parts.scheme, parts.hostname, parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.metrics = []
+        self._idle = []
+        self._lock = threading.Lock()
+        self._ssl = None
+        if self.scheme == "https":
+            self._ssl = ssl.create_default_context()
+            if not verify:
+                self._ssl.check_hostname = False
+                self._ssl.verify_mode = ssl.CERT_NONE
+
+    def _connect(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._ssl)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        """(connection, reused) from the idle pool, or a new connection."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _drop_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def close(self):
+        self._drop_idle()
+
+    def request(self, method, path):
+        """Send one request and return the decoded JSON body; raises LudusError."""
+        headers = {"X-API-KEY": self.api_key, "Accept": "application/json"}
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, self.prefix + path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused:
+                    # Keep-alive connections sat idle while prompts were up;
+                    # the server has most likely closed them all.
+                    self._drop_idle()
+                    continue
+                status, error = None, f"{type(e).__name__}: {e}"
+            else:
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if status not in RETRY_STATUSES:
+                    break
+                error = f"HTTP {status}"
+            if attempt == self.retries:
+                break
+            time.sleep(min(self.backoff * 2 ** attempt, BACKOFF_MAX))
+            attempt += 1
+        self.metrics.append(RequestTiming("api", method, path, status, attempt + 1, time.perf_counter() - started))
+
+        if status is None or status in RETRY_STATUSES:
+            raise LudusError(f"{method} {path}: {error} (after {self.retries + 1} attempts)", status)
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            raise LudusError(f"{method} {path}: HTTP {status}, response is not JSON", status)
+        if status >= 400:
+            message = data.get("error") if isinstance(data, dict) else None
+            raise LudusError(f"{method} {path}: HTTP {status}" + (f": {message}" if message else ""), status)
+        return data
+
+    def templates(self):
+        return parse_templates(self.request("GET", "/templates"))
+
+    def roles(self):
+        return parse_roles(self.request("GET", "/ansible"))
+
+    def range_config(self):
+        return parse_range_config(self.request("GET", "/range/config"))
+
+    def range_status(self):
+        return parse_range(self.request("GET", "/range"))
+
+# --------------------------------------------------------------------------
+# Shared client and CLI fallback
+# --------------------------------------------------------------------------
+
+_client = None
+_client_checked = False
+_client_lock = threading.Lock()
+# Timings of CLI calls made by this process.
+cli_metrics = []
+# Lookup name -> (LudusError, time.monotonic() when it failed).
+_failures = {}
+
+def get_client():
+    """The process-wide LudusClient, or None when the API is not configured."""
+    global _client, _client_checked
+    with _client_lock:
+        if not _client_checked:
+            _client_checked = True
+            url, _ = ludus_identity()
+            api_key = os.environ.get("LUDUS_API_KEY", "")
+            if url and api_key and os.environ.get("LUDUS_CLIENT", "api") != "cli":
+                try:
+                    _client = LudusClient(url, api_key, verify=bool(cli_config().get("verify", False)))
+                except ValueError as e:
+                    print(f"Warning: LUDUS_URL ignored, using the ludus CLI: {e}", file=sys.stderr)
+            if os.environ.get("LUDUS_CLIENT_METRICS") == "1":
+                atexit.register(print_metrics, sys.stderr)
+        return _client
+
+def run_cli(*args):
+    """Run the ludus CLI and return stdout; raises LudusError with its stderr."""
+    started = time.perf_counter()
+    status = None
+    try:
+        result = subprocess.run(["ludus", *args], check=True, capture_output=True, text=True, encoding="utf-8")
+        status = 0
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        status = e.returncode
+        raise LudusError(f"`ludus {' '.join(args)}` failed: {(e.stderr or e.stdout or '').strip() or f'exit status {e.returncode}'}")
+    except FileNotFoundError:
+        raise LudusError("the 'ludus' command was not found; ensure Ludus is installed and in your PATH")
+    finally:
+        cli_metrics.append(RequestTiming("cli", "", " ".join(args), status, 1, time.perf_counter() - started))
+
+def cli_json(*args):
+    out = run_cli(*args, "--json")
+    try:
+        return json.loads(out)
+    except ValueError:
+        raise LudusError(f"`ludus {' '.join(args)} --json` did not return JSON")
+
+def lookup(api_call, cli_call, name=None):
+    """
+    api_call(client) when the API is configured, else (or if it fails) cli_call().
+
+    With a `name`, a failure is re-raised without trying again for FAILURE_TTL seconds.
+    """
+    if name:
+        failed = _failures.get(name)
+        if failed and time.monotonic() - failed[1] < FAILURE_TTL:
+            raise failed[0]
+    try:
+        result = _lookup_once(api_call, cli_call)
+    except LudusError as e:
+        if name:
+            _failures[name] = (e, time.monotonic())
+        raise
+    _failures.pop(name, None)
+    return result
+
+def clear_failures():
+    """Forget cached lookup failures, e.g. when the operator asks for a refresh."""
+    _failures.clear()
+
+def _lookup_once(api_call, cli_call):
+    client = get_client()
+    if client is None:
+        return cli_call()
+    try:
+        return api_call(client)
+    except LudusError as api_error:
+        # The CLI may still work (e.g. a different URL or key in its keyring).
+        try:
+            return cli_call()
+        except LudusError as cli_error:
+            raise LudusError(f"API: {api_error}; CLI: {cli_error}", api_error.status)
+
+def list_templates():
+    """[Template] for the current Ludus user."""
+    return lookup(LudusClient.templates, lambda: parse_templates(cli_json("templates", "list")), "templates")
+
+def list_roles():
+    """[Role] installed for the current Ludus user (roles and collections)."""
+    return lookup(LudusClient.roles, lambda: parse_roles(cli_json("ansible", "role", "list")), "roles")
+
+def get_range_config():
+    """The range config currently set, as YAML text."""
+    return lookup(LudusClient.range_config, lambda: run_cli("range", "config", "get"), "config")
+
+def get_range_status():
+    """RangeStatus of the current range (never failure-cached: it is polled)."""
+    return lookup(LudusClient.range_status, lambda: parse_range(cli_json("range", "list")))
+
+# --------------------------------------------------------------------------
+# Metrics
+# --------------------------------------------------------------------------
+
+def all_metrics():
+    return (_client.metrics if _client else []) + cli_metrics
+
+def summarize_metrics(metrics):
+    """{(source, path): {'requests', 'retries', 'total_s', 'max_s'}}"""
+    summary = {}
+    for m in metrics:
+        entry = summary.setdefault((m.source, m.path), {"requests": 0, "retries": 0, "total_s": 0.0, "max_s": 0.0})
+        entry["requests"] += 1
+        entry["retries"] += m.attempts - 1
+        entry["total_s"] += m.seconds
+        entry["max_s"] = max(entry["max_s"], m.seconds)
+    return summary
+
+def print_metrics(out=sys.stdout):
+    summary = summarize_metrics(all_metrics())
+    if not summary:
+        return
+    print(f"\n  {'source':<6} {'request':<28} {'count':>5} {'retries':>7} {'total s':>8} {'max s':>7}", file=out)
+    for (source, path), s in sorted(summary.items()):
+        print(f"  {source:<6} {path:<28} {s['requests']:>5} {s['retries']:>7} {s['total_s']:>8.3f} {s['max_s']:>7.3f}", file=out)
+
+# --------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------
+
+LOOKUPS = {
+    "templates": list_templates,
+    "roles": list_roles,
+    "config": get_range_config,
+    "status": get_range_status,
+}
+
+def as_json(value):
+    if isinstance(value, RangeStatus):
+        return {**value._asdict(), "vms": [vm._asdict() for vm in value.vms]}
+    if isinstance(value, list):
+        return [item._asdict() for item in value]
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the Ludus API (falling back to the ludus CLI).")
+    parser.add_argument("lookup", choices=sorted(LOOKUPS))
+    parser.add_argument("--json", action="store_true", help="Print the typed result as JSON")
+    parser.add_argument("--cli", action="store_true", help="Use the ludus CLI only (same as LUDUS_CLIENT=cli)")
+    parser.add_argument("--metrics", action="store_true", help="Print request timings")
+    args = parser.parse_args()
+
+    if args.cli:
+        os.environ["LUDUS_CLIENT"] = "cli"
+    try:
+        result = LOOKUPS[args.lookup]()
+    except LudusError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(as_json(result), indent=2))
+    elif args.lookup == "config":
+        print(result, end="")
+    elif args.lookup == "status":
+        print(f"{result.user_id or '?'} range {result.range_number}: {result.state}, {len(result.vms)} VM(s)")
+        for vm in result.vms:
+            print(f"  {vm.name:<40} {'on ' if vm.powered_on else 'off'} {vm.ip}")
+    elif args.lookup == "templates":
+        for t in result:
+            print(f"  {t.name:<44} {'built' if t.built else 'not built'}")
+    else:
+        for r in result:
+            print(f"  {r.name:<44} {r.version:<10} {r.type}{' (global)' if r.is_global else ''}")
+    if args.metrics:
+        print_metrics()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+ludus_prefetch.py
+
+Background lookups for the interactive builders:
+- Each lookup (templates, installed roles, applied range config, range
+  status, ...) starts in its own daemon thread as soon as the builder
+  starts, so the first prompt appears immediately even on a slow server
+- Results are awaited only where a prompt actually needs them; the wait
+  is announced only if the lookup is still running
+- Exceptions (including SystemExit) raised by a lookup are re-raised in
+  the caller when the result is requested, never printed mid-prompt
+- Results can be given a max age, after which they are fetched again
+
+Lookups must not print or prompt: they run while the operator is typing.
+Daemon threads never delay exit when the operator quits early.
+
+Usage:
+    prefetch = Prefetch()
+    prefetch.start("templates", fetch_templates)
+    ...
+    templates = prefetch.get("templates", "Ludus templates")
+"""
+
+import sys
+import time
+import threading
+from concurrent.futures import Future
+
+
+class Prefetch:
+    """Named background lookups whose results are awaited on first use."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self._jobs = {}
+
+    def start(self, name, fn, *args):
+        """(Re)start lookup `name` as fn(*args) in a daemon thread; returns its Future."""
+        future = Future()
+        job = {"future": future, "fn": fn, "args": args, "done_at": None}
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            job["done_at"] = time.monotonic()
+
+        self._jobs[name] = job
+        threading.Thread(target=run, name=f"prefetch-{name}", daemon=True).start()
+        return future
+
+    def __contains__(self, name):
+        return name in self._jobs
+
+    def discard(self, name):
+        """Forget lookup `name` so the next start() runs it again."""
+        self._jobs.pop(name, None)
+
+    def get(self, name, label=None, max_age=None):
+        """
+        Result of lookup `name`, waiting for it if needed.
+
+        A result older than `max_age` seconds is fetched again first.
+        """
+        job = self._jobs[name]
+        if max_age is not None and job["done_at"] is not None and time.monotonic() - job["done_at"] > max_age:
+            self.start(name, job["fn"], *job["args"])
+            job = self._jobs[name]
+        future = job["future"]
+        if not future.done() and label:
+            print(f"Waiting for {label}...", file=self.out, flush=True)
+        return future.result()
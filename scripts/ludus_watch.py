@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+ludus_watch.py
+
+Watches a Ludus range deployment without re-printing `ludus range list`:
+- Polls range state with an adaptive interval (fast while things change,
+  backing off while they don't)
+- Prints only transitions: range state, VM power/IP, role start/finish
+- Reads only the tail of the deploy log each poll and parses just the
+  lines added since the previous one
+- Records per-VM and per-role timestamps (optionally as JSON)
+- Exits 0 when the deploy succeeds, 1 when it fails, 2 on timeout
+
+Usage:
+    python3 ludus_watch.py [--deploy] [--timeline deploy.json] [--timeout 7200]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+
+from ludus_client import LudusError, run_cli, get_range_status
+
+POLL_MIN = 5
+POLL_MAX = 60
+POLL_BACKOFF = 1.5
+
+SUCCESS_STATES = {"SUCCESS"}
+FAILED_STATES = {"ERROR", "ABORTED"}
+# `ludus range deploy` returns before the state flips to DEPLOYING; a
+# terminal state seen within this window is the previous deploy's.
+START_GRACE = 60
+
+LOG_TAIL = 500    # deploy log lines fetched per poll
+LOG_ANCHOR = 5    # trailing lines kept to find where the previous poll stopped
+
+TASK_RE = re.compile(r"^TASK \[(?:(?P<role>[^\]:]+?) : )?[^\]]*\]")
+RESULT_RE = re.compile(r"^(?P<status>ok|changed|failed|fatal|skipping|unreachable): \[(?P<host>[^\]]+)\]")
+
+# --------------------------------------------------------------------------
+# Ludus queries
+# --------------------------------------------------------------------------
+
+def ludus(*args):
+    """Run the ludus CLI and return stdout, or None if it fails."""
+    try:
+        return run_cli(*args)
+    except LudusError:
+        return None
+
+def fetch_range():
+    """Return {'state': str, 'vms': {name: (powered_on, ip)}} or None."""
+    try:
+        status = get_range_status()
+    except LudusError:
+        return None
+    return {"state": status.state, "vms": {vm.name: (vm.powered_on, vm.ip) for vm in status.vms}}
+
+def fetch_log(tail=LOG_TAIL):
+    """Return the last `tail` deploy log lines, or None."""
+    out = ludus("range", "logs", "--tail", str(tail))
+    return None if out is None else out.splitlines()
+
+# --------------------------------------------------------------------------
+# Watcher
+# --------------------------------------------------------------------------
+
+class DeployWatcher:
+    """Turns successive range/log snapshots into transitions and timestamps."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.started = time.time()
+        self.state = None
+        self.vms = {}
+        self.log_anchor = []
+        self.current_role = None
+        self.host_role = {}   # host -> role currently running on it
+        self.timeline = {"range": [], "vms": {}, "roles": {}}
+
+    def emit(self, message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=self.out, flush=True)
+
+    def update_range(self, snapshot, now):
+        changed = False
+        if snapshot["state"] != self.state:
+            self.emit(f"range: {self.state or '-'} -> {snapshot['state']}")
+            self.timeline["range"].append({"state": snapshot["state"], "at": now})
+            self.state = snapshot["state"]
+            changed = True
+        for name, (powered_on, ip) in sorted(snapshot["vms"].items()):
+            if self.vms.get(name) == (powered_on, ip):
+                continue
+            status = "running" if powered_on else "stopped"
+            self.emit(f"{name}: {status}{f' ({ip})' if ip else ''}")
+            self.timeline["vms"].setdefault(name, []).append({"status": status, "ip": ip, "at": now})
+            self.vms[name] = (powered_on, ip)
+            changed = True
+        return changed
+
+    def new_log_lines(self, lines):
+        """The part of a log tail after the previous poll's, or all of it if the two don't overlap."""
+        anchor = self.log_anchor
+        if lines:
+            self.log_anchor = lines[-LOG_ANCHOR:]
+        if not anchor:
+            return lines
+        # The earliest match at worst re-reads a few lines, which is harmless; skipping some is not.
+        n = len(anchor)
+        for end in range(n, len(lines) + 1):
+            if lines[end - n:end] == anchor:
+                return lines[end:]
+        # More than a tail's worth of new output, or a new deploy's log.
+        self.current_role = None
+        return lines
+
+    def update_log(self, lines, now):
+        changed = False
+        for line in self.new_log_lines(lines):
+            task = TASK_RE.match(line)
+            if task:
+                self.current_role = task.group("role")
+                continue
+            result = RESULT_RE.match(line)
+            if not result or not self.current_role:
+                continue
+            host, status = result.group("host"), result.group("status")
+            key = f"{host} {self.current_role}"
+            entry = self.timeline["roles"].get(key)
+            if entry is None:
+                previous = self.host_role.get(host)
+                if previous:
+                    changed |= self.finish_role(host, previous, now)
+                entry = self.timeline["roles"][key] = {"host": host, "role": self.current_role,
+                                                       "start": now, "end": None, "failed": False}
+                self.host_role[host] = self.current_role
+                self.emit(f"{host}: {self.current_role} started")
+                changed = True
+            if status in ("failed", "fatal", "unreachable") and not entry["failed"]:
+                entry["failed"] = True
+                self.emit(f"{host}: {self.current_role} {status.upper()}")
+                changed = True
+        return changed
+
+    def finish_role(self, host, role, now):
+        entry = self.timeline["roles"][f"{host} {role}"]
+        if entry["end"] is not None:
+            return False
+        entry["end"] = now
+        self.emit(f"{host}: {role} finished in {int(now - entry['start'])}s")
+        return True
+
+    def finish(self, now):
+        for host, role in self.host_role.items():
+            self.finish_role(host, role, now)
+
+def watch_deployment(timeout=None, timeline_path=None, on_poll=None):
+    """
+    Poll until the deploy reaches a terminal state; return the process exit code.
+
+    on_poll(watcher), if given, runs after every poll, e.g. to act on roles
+    as they finish.
+    """
+    watcher = DeployWatcher()
+    interval, seen_active, code = POLL_MIN, False, 2
+    try:
+        while True:
+            now = time.time()
+            changed = False
+            snapshot = fetch_range()
+            if snapshot is None:
+                watcher.emit("could not query range state; retrying")
+            else:
+                changed |= watcher.update_range(snapshot, now)
+                seen_active |= snapshot["state"] not in SUCCESS_STATES | FAILED_STATES
+            lines = fetch_log()
+            if lines is not None:
+                changed |= watcher.update_log(lines, now)
+            if on_poll:
+                on_poll(watcher)
+
+            if snapshot and (seen_active or now - watcher.started > START_GRACE):
+                if snapshot["state"] in SUCCESS_STATES | FAILED_STATES:
+                    watcher.finish(now)
+                    code = 0 if snapshot["state"] in SUCCESS_STATES else 1
+                    break
+            if timeout and now - watcher.started > timeout:
+                watcher.emit(f"timed out after {timeout}s")
+                break
+
+            interval = POLL_MIN if changed else min(interval * POLL_BACKOFF, POLL_MAX)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        watcher.emit("interrupted")
+        code = 130
+
+    elapsed = int(time.time() - watcher.started)
+    watcher.emit(f"deploy {watcher.state or 'UNKNOWN'} after {elapsed}s")
+    if timeline_path:
+        with open(timeline_path, "w") as f:
+            json.dump(watcher.timeline, f, indent=2)
+    return code
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a Ludus range deployment and exit with its result.")
+    parser.add_argument("--deploy", action="store_true", help="Run `ludus range deploy` first")
+    parser.add_argument("--timeout", type=int, help="Give up after this many seconds (exit 2)")
+    parser.add_argument("--timeline", help="Write per-VM/per-role timestamps to this JSON file")
+    args = parser.parse_args()
+
+    if args.deploy and ludus("range", "deploy") is None:
+        print("Error: `ludus range deploy` failed.", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(watch_deployment(args.timeout, args.timeline))
+
+if __name__ == "__main__":
+    main()
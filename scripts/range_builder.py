@@ -7,71 +7,99 @@ Interactive Ludus Range Builder with:
 - Shared vs per-VM admin creds
 - Optional GPO to disable Windows Defender
 - Default attacker VLAN-99 VMs
-- Dynamic template selection menu
-- Interactive VLAN, IP, CPU, RAM prompts
-- Dual YAML: open + segmented
+- Dynamic template selection menu (templates and range status are looked
+  up in the background while the first prompts are answered)
+- Interactive VLAN, IP, CPU, RAM prompts (IPs checked for collisions)
+- Dual YAML: open + segmented, streamed to disk in one render pass and
+  parsed back before they replace earlier output
 - Final menu: save, set config, deploy & watch, or discard.
+
+Usage:
+    python3 range_builder.py [--range-id 10] [-o range] [--refresh-templates]
 """
 
 import os
+import re
 import sys
+import json
 import argparse
-import subprocess
 import getpass
-from jinja2 import Template
+
+import yaml
+from jinja2 import Environment, DictLoader
+
+from ludus_cache import cache_path, load_cache, save_cache, clear_cache
+from ip_allocator import IPAllocator, AllocationError
+from ludus_client import LudusError, list_templates, clear_failures
+from ludus_prefetch import Prefetch
+from ludus_watch import ludus, fetch_range, watch_deployment
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# Seconds a fetched `ludus templates list` stays valid on disk.
+TEMPLATE_CACHE_TTL = int(os.environ.get("LUDUS_TEMPLATE_CACHE_TTL", 900))
+# Range states in which starting another deploy would race the running one.
+BUSY_STATES = {"DEPLOYING", "WAITING"}
+# The range status is looked up again if it is older than this when a deploy is offered.
+STATUS_MAX_AGE = 30
 
 # --------------------------------------------------------------------------
 # Templates
 # --------------------------------------------------------------------------
 
-OPEN_TEMPLATE = """
-clone_type: "{{ clone_type }}"
-disable_windows_defender_gpo: {{ disable_defender | lower }}
+# Rendered with trim_blocks/lstrip_blocks: block tags take no space in the
+# output. Every string goes through the `yaml` filter (a JSON string is a
+# valid YAML double-quoted scalar), so odd names or values can't break the
+# document.
+OPEN_TEMPLATE = """\
+clone_type: {{ clone_type | yaml }}
+disable_windows_defender_gpo: {{ disable_defender | yaml }}
 
-global_role_vars:
+global_role_vars:{{ " {}" if not global_role_vars else "" }}
 {% for k, v in global_role_vars.items() %}
-  {{ k }}: "{{ v }}"
+  {{ k | yaml_key }}: {{ v | yaml }}
 {% endfor %}
 
-vms:
+vms:{{ " []" if not vms else "" }}
 {% for vm in vms %}
-  - vm_name: "{{ vm.vm_name }}"
-    hostname: "{{ vm.hostname }}"
-    template: "{{ vm.template }}"
-    vlan: {{ vm.vlan }}
-    ip_last_octet: {{ vm.ip_last_octet }}
-    cpus: {{ vm.cpus }}
-    ram: {{ vm.ram }}
+  - vm_name: {{ vm.vm_name | yaml }}
+    hostname: {{ vm.hostname | yaml }}
+    template: {{ vm.template | yaml }}
+    vlan: {{ vm.vlan | yaml }}
+    ip_last_octet: {{ vm.ip_last_octet | yaml }}
+    cpus: {{ vm.cpus | yaml }}
+    ram: {{ vm.ram | yaml }}
 {%   if vm.domain %}
     domain:
-      fqdn: "{{ vm.domain.fqdn }}"
-      role: "{{ vm.domain.role }}"
+      fqdn: {{ vm.domain.fqdn | yaml }}
+      role: {{ vm.domain.role | yaml }}
 {%   endif %}
-    roles:
-{%   if vm.roles|length == 0 %}
-      [] 
-{%   else %}
-{%     for role in vm.roles %}
-      - name: {{ role.name }}
-{%       if role.depends_on %}
+    roles:{{ " []" if not vm.roles else "" }}
+{%   for role in vm.roles %}
+      - name: {{ role.name | yaml }}
+{%     if role.depends_on %}
         depends_on:
-{%         for d in role.depends_on %}
-          - vm_name: "{{ d.vm_name }}"
-            role: {{ d.role }}
-{%         endfor %}
-{%       endif %}
-{%       if role.vars %}
+{%       for d in role.depends_on %}
+          - vm_name: {{ d.vm_name | yaml }}
+            role: {{ d.role | yaml }}
+{%       endfor %}
+{%     endif %}
+{%     if role.vars %}
         vars:
-{%         for key, val in role.vars.items() %}
-          {{ key }}: "{{ val }}"
-{%         endfor %}
-{%       endif %}
-{%     endfor %}
-{%   endif %}
+{%       for key, val in role.vars.items() %}
+          {{ key | yaml_key }}: {{ val | yaml }}
+{%       endfor %}
+{%     endif %}
+{%   endfor %}
 {% endfor %}
 """
 
-SEGMENTED_TEMPLATE = """
+# Written ahead of the open document, which generate() renders once and
+# streams into both files.
+SEGMENTED_TEMPLATE = """\
 # Segmented networking policies
 network_policies:
   default_isolate_vlans: true
@@ -87,21 +115,19 @@ network_policies:
       trust: true
 
 # VM definitions (same as open)
-{{ open_yaml }}
 """
 
+# Keys left unquoted; anything else (and YAML 1.1 booleans/null) is quoted.
+PLAIN_KEY_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_.-]*$")
+RESERVED_KEYS = {"y", "yes", "n", "no", "true", "false", "on", "off", "null"}
+
+# Rendered chunks joined into each write while streaming.
+STREAM_BUFFER = 64
+
 # --------------------------------------------------------------------------
 # Helpers
 # --------------------------------------------------------------------------
 
-def run_cmd(cmd):
-    """Run a shell command and return output stripped, or None if fails."""
-    try:
-        out = subprocess.check_output(cmd, shell=True, text=True)
-        return [l.strip() for l in out.splitlines() if l.strip()]
-    except subprocess.CalledProcessError:
-        return []
-
 def pick_from_list(prompt, items, default_idx=0):
     """Show numbered list, prompt user to pick an index."""
     for i, item in enumerate(items):
@@ -143,8 +169,17 @@ def ask_int(prompt, default, min_val=None, max_val=None):
             continue
         return val
 
-def ask_global_creds():
-    print("\nEnter GLOBAL domain admin credentials:")
+def ask_octet(prompt, allocator, vlan, owner, role=None):
+    """Ask for an IP last octet, defaulting to the next free one; re-asks on collisions."""
+    while True:
+        ip = ask_int(prompt, default=allocator.next_free(vlan, role), min_val=1, max_val=254)
+        try:
+            return allocator.claim(vlan, ip, owner)
+        except AllocationError as e:
+            print(f"→ {e}")
+
+def ask_global_creds(scope="GLOBAL"):
+    print(f"\nEnter {scope} domain admin credentials:")
     admin = ask("  Admin UPN", default="Administrator@parent.local")
     pwd   = getpass.getpass("  Admin password: ")
     dsrcm = getpass.getpass("  Safe-Mode (DSRM) password: ")
@@ -162,9 +197,65 @@ def ask_vm_resources(vm_name):
     ram  = ask_int("  RAM (GB)", default=2, min_val=1)
     return cpus, ram
 
-def select_template():
-    print("\nFetching available templates…")
-    templates = run_cmd("ludus templates list | grep TRUE | awk '{print $2}'")
+_templates = None
+_refresh_pending = os.environ.get("LUDUS_TEMPLATES_REFRESH") == "1"
+# Background Ludus lookups, started by start_prefetch() and awaited on first use.
+prefetch = Prefetch()
+
+def fetch_templates(refresh=False):
+    """
+    Built templates from the disk cache, or from `ludus templates list`.
+
+    Prints nothing, so it can run in the background while prompts are up.
+    Returns None when the fetch fails.
+    """
+    path = cache_path("templates")
+    if refresh:
+        clear_cache(path)
+        clear_failures()
+    else:
+        templates = load_cache(path, TEMPLATE_CACHE_TTL)
+        if templates is not None:
+            return templates
+    try:
+        templates = [t.name for t in list_templates() if t.built]
+    except LudusError:
+        templates = None
+    # Never persist a failed/empty fetch; retry on the next call instead.
+    if not templates:
+        return None
+    save_cache(path, templates)
+    return templates
+
+def start_prefetch(refresh_templates=False):
+    """Starts the template and range status lookups before the first prompt."""
+    global _refresh_pending
+    prefetch.start("templates", fetch_templates, refresh_templates or _refresh_pending)
+    prefetch.start("status", fetch_range)
+    _refresh_pending = False
+
+def get_templates(refresh=False):
+    """
+    Built templates for the current Ludus server/user.
+
+    Fetched at most once per session; across sessions the list is reused
+    from disk for TEMPLATE_CACHE_TTL seconds. refresh=True (or
+    LUDUS_TEMPLATES_REFRESH=1) drops both layers and queries Ludus again.
+    """
+    global _templates, _refresh_pending
+    if refresh or _refresh_pending:
+        _templates, _refresh_pending = None, False
+        prefetch.start("templates", fetch_templates, True)
+    if _templates is None:
+        if "templates" not in prefetch:
+            prefetch.start("templates", fetch_templates)
+        _templates = prefetch.get("templates", "the Ludus template list")
+        if _templates is None:
+            prefetch.discard("templates")
+    return _templates or []
+
+def select_template(refresh=False):
+    templates = get_templates(refresh)
     if not templates:
         print("⚠ Unable to fetch templates—fallback to manual entry.")
         return ask("Template name", default="win2019-server-x64-template")
@@ -191,38 +282,39 @@ class VM:
 # Builders
 # --------------------------------------------------------------------------
 
-def build_default_attackers(range_id):
+def build_default_attackers(range_id, allocator):
     vlan = 99
     vms = []
+    vm_name = lambda host: f"{range_id}-{host}" if range_id else host
     # Kali
     tpl = select_template()
     cpus, ram = ask_vm_resources("KALI-ATTACK")
-    vms.append(VM("KALI-ATTACK","KALI-ATTACK",tpl,vlan,10,cpus,ram))
+    vms.append(VM(vm_name("KALI-ATTACK"),"KALI-ATTACK",tpl,vlan,allocator.claim(vlan,10,"KALI-ATTACK"),cpus,ram))
     # Win-Attack
     tpl = select_template()
     cpus, ram = ask_vm_resources("WIN-ATTACK")
-    vms.append(VM("WIN-ATTACK","WIN-ATTACK",tpl,vlan,20,cpus,ram))
+    vms.append(VM(vm_name("WIN-ATTACK"),"WIN-ATTACK",tpl,vlan,allocator.claim(vlan,20,"WIN-ATTACK"),cpus,ram))
     # TeamServers
     for i in range(1, ask_int("How many TeamServers?", 1, 1, 2)+1):
         tpl = select_template()
         cpus, ram = ask_vm_resources(f"TEAMSERVER{i}")
-        vms.append(VM(f"TEAMSERVER{i}",f"TEAMSERVER{i}",tpl,vlan,100*i,cpus,ram))
+        vms.append(VM(vm_name(f"TEAMSERVER{i}"),f"TEAMSERVER{i}",tpl,vlan,allocator.claim(vlan,100*i,f"TEAMSERVER{i}"),cpus,ram))
     # Redirectors
     domains  = ["jonesphotography.com","militarydiscounts.com"]
     for i in range(1, ask_int("How many Redirectors?", 1, 1, 2)+1):
         tpl = select_template()
         cpus, ram = ask_vm_resources(f"REDIRECTOR{i}")
-        vms.append(VM(f"REDIRECTOR{i}",f"REDIRECTOR{i}",tpl,vlan,10+i,cpus,ram,
+        vms.append(VM(vm_name(f"REDIRECTOR{i}"),f"REDIRECTOR{i}",tpl,vlan,allocator.claim(vlan,10+i,f"REDIRECTOR{i}"),cpus,ram,
                       domain={"fqdn": domains[i-1], "role": "redirector"}))
     return vms
 
-def add_custom_vms(vms, use_global_creds):
+def add_custom_vms(vms, use_global_creds, allocator):
     while ask_yesno("Add a custom VM?", default=False):
         name  = ask("VM name", default=f"VM{len(vms)+1}")
         host  = ask("Hostname", default=name)
         tpl   = select_template()
         vlan  = ask_int("VLAN", default=10, min_val=1)
-        ip    = ask_int("IP last octet", default=10, min_val=1, max_val=254)
+        ip    = ask_octet("IP last octet", allocator, vlan, name)
         cpus, ram = ask_vm_resources(name)
         domain = None
         if ask_yesno("  Domain-joined?", default=False):
@@ -246,4 +338,182 @@ def add_custom_vms(vms, use_global_creds):
                     k = ask("          Var name", default="")
                     v = ask("          Var value", default="")
                     role["vars"][k] = v
-            vm
+            vm.roles.append(role)
+        if not use_global_creds and vm.roles:
+            creds = ask_global_creds(scope=name)
+            for role in vm.roles:
+                role["vars"] = {**creds, **role["vars"]}
+        vms.append(vm)
+    return vms
+
+# --------------------------------------------------------------------------
+# Rendering
+# --------------------------------------------------------------------------
+
+def yaml_scalar(value):
+    return json.dumps(value, ensure_ascii=False)
+
+def yaml_key(key):
+    key = str(key)
+    return key if PLAIN_KEY_RE.match(key) and key.lower() not in RESERVED_KEYS else yaml_scalar(key)
+
+_env = None
+_segmented_checked = False
+
+def get_environment():
+    """Jinja environment holding the templates; each is compiled once per process."""
+    global _env
+    if _env is None:
+        _env = Environment(
+            loader=DictLoader({"open.yml": OPEN_TEMPLATE, "segmented.yml": SEGMENTED_TEMPLATE}),
+            trim_blocks=True, lstrip_blocks=True, keep_trailing_newline=True, auto_reload=False)
+        _env.filters["yaml"] = yaml_scalar
+        _env.filters["yaml_key"] = yaml_key
+    return _env
+
+def validate_yaml(stream, n_vms=None):
+    """
+    Runs YAML through the parser (libyaml when available) without building
+    it in memory; checks for a top-level mapping and, if given, the number
+    of items in its `vms` list. Raises yaml.YAMLError or ValueError.
+    """
+    depth, key, expect_key, count = 0, None, False, 0
+    for event in yaml.parse(stream, Loader=YamlLoader):
+        if isinstance(event, yaml.CollectionStartEvent):
+            if depth == 0 and not isinstance(event, yaml.MappingStartEvent):
+                raise ValueError("top level is not a mapping")
+            if depth == 2 and key == "vms":
+                count += 1
+            depth += 1
+            expect_key = depth == 1
+        elif isinstance(event, yaml.CollectionEndEvent):
+            depth -= 1
+            expect_key = depth == 1
+        elif isinstance(event, yaml.ScalarEvent) and depth == 1:
+            if expect_key:
+                key = event.value
+            expect_key = not expect_key
+    if n_vms is not None and count != n_vms:
+        raise ValueError(f"rendered YAML has {count} VM(s), expected {n_vms}")
+
+def generate(open_path, segmented_path, vms, clone_type="linked", disable_defender=True, global_role_vars=None):
+    """
+    Renders the open and segmented range files in one streaming pass.
+
+    The open document is rendered once and each chunk is written to both
+    files, so no full copy of either output is held in memory. The open
+    file is parsed back before either replaces earlier output; the
+    segmented file is the static policy header (checked once) followed by
+    the same bytes.
+    """
+    global _segmented_checked
+    env = get_environment()
+    if not _segmented_checked:
+        validate_yaml(SEGMENTED_TEMPLATE)
+        _segmented_checked = True
+    context = {"clone_type": clone_type, "disable_defender": disable_defender,
+               "global_role_vars": global_role_vars or {}, "vms": vms}
+    tmp_paths = [f"{open_path}.tmp", f"{segmented_path}.tmp"]
+    try:
+        with open(tmp_paths[0], "w") as open_f, open(tmp_paths[1], "w") as segmented_f:
+            env.get_template("segmented.yml").stream(context).dump(segmented_f)
+            stream = env.get_template("open.yml").stream(context)
+            stream.enable_buffering(STREAM_BUFFER)
+            for chunk in stream:
+                open_f.write(chunk)
+                segmented_f.write(chunk)
+        with open(tmp_paths[0]) as f:
+            validate_yaml(f, len(vms))
+    except BaseException:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    os.replace(tmp_paths[0], open_path)
+    os.replace(tmp_paths[1], segmented_path)
+    return open_path, segmented_path
+
+# --------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------
+
+def deploy(open_path):
+    """
+    Set the open config and run a full `ludus range deploy`, then watch it.
+
+    The output is in this builder's own `vms:` schema, not the `ludus:` list
+    range_diff.py compares VM by VM, so a limited deploy is not possible.
+    """
+    status = prefetch.get("status", "the range status", max_age=STATUS_MAX_AGE)
+    if status and status["state"] in BUSY_STATES and \
+            not ask_yesno(f"The range is currently {status['state']}. Deploy anyway?", default=False):
+        print("Deploy skipped; the range config was not changed.")
+        return 0
+    if ludus("range", "config", "set", "-f", open_path) is None:
+        print(f"Error: `ludus range config set -f {open_path}` failed.", file=sys.stderr)
+        return 1
+    if ludus("range", "deploy") is None:
+        print("Error: `ludus range deploy` failed.", file=sys.stderr)
+        return 1
+    print("Deployment started. Watching for state changes (Ctrl+C to stop)...")
+    return watch_deployment()
+
+def final_menu(open_path, segmented_path):
+    """Save, load into Ludus, deploy & watch, or discard the generated files."""
+    print("\nFinal menu:")
+    choice = pick_from_list("Choose", [
+        "Save & exit",
+        f"Save & `ludus range config set -f {open_path}`",
+        "Save + set config + `ludus range deploy` + live watch",
+        "Discard",
+    ])
+    if choice.startswith("Discard"):
+        for path in (open_path, segmented_path):
+            os.remove(path)
+        print("Discarded.")
+        return 0
+    if choice == "Save & exit":
+        print(f"Saved {open_path} and {segmented_path}.")
+        return 0
+    if choice.startswith("Save +"):
+        return deploy(open_path)
+    if ludus("range", "config", "set", "-f", open_path) is None:
+        print(f"Error: `ludus range config set -f {open_path}` failed.", file=sys.stderr)
+        return 1
+    print("Range config set.")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Interactive Ludus range builder (open + segmented YAML).")
+    parser.add_argument("--range-id", help="Prefix for the default attacker vm_names, e.g. 10 -> 10-KALI-ATTACK")
+    parser.add_argument("-o", "--output-prefix", default="range",
+                        help="Writes <prefix>_build.yml and <prefix>_segmented.yml (default: range)")
+    parser.add_argument("--refresh-templates", action="store_true",
+                        help="Ignore the cached `ludus templates list` and fetch it again")
+    args = parser.parse_args()
+
+    start_prefetch(args.refresh_templates)
+    allocator = IPAllocator()
+
+    clone_type = "full" if ask_yesno("Use full clones (slower, independent of the template)?", default=False) else "linked"
+    use_global_creds = ask_yesno("Use shared admin credentials for every VM?", default=True)
+    global_role_vars = ask_global_creds() if use_global_creds else {}
+    disable_defender = ask_yesno("Include GPO to disable Windows Defender?", default=True)
+
+    vms = []
+    if ask_yesno("Include default attacker setup (VLAN 99)?", default=True):
+        vms = build_default_attackers(args.range_id, allocator)
+    vms = add_custom_vms(vms, use_global_creds, allocator)
+
+    open_path, segmented_path = f"{args.output_prefix}_build.yml", f"{args.output_prefix}_segmented.yml"
+    try:
+        generate(open_path, segmented_path, vms, clone_type, disable_defender, global_role_vars)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: could not write the range files: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nWrote {open_path} and {segmented_path} ({len(vms)} VMs).")
+    allocator.print_report()
+    sys.exit(final_menu(open_path, segmented_path))
+
+if __name__ == "__main__":
+    main()
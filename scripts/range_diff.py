@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+range_diff.py
+
+Incremental redeploys for a Ludus range:
+- Diffs a new config against the one currently applied (`ludus range
+  config get`, or --previous FILE), per VM by vm_name
+- Reports added, removed and changed VMs (with the changed fields)
+- Deploys only the affected VMs plus everything downstream of them in
+  the depends_on graph: `ludus range deploy --limit localhost,<vms>`
+
+Changes outside the `ludus` list (defaults, network, global_role_vars)
+affect every VM, so they fall back to a full deploy.
+
+Usage:
+    python3 range_diff.py new-config.yml [--previous old.yml] [--range-id MH] [--deploy] [--no-watch]
+"""
+
+import re
+import sys
+import json
+import argparse
+
+import yaml
+
+from analyze_range import load_config, build_graph, dependents, PROVISION
+from ludus_client import LudusError, get_range_config
+from ludus_watch import ludus, watch_deployment
+
+RANGE_ID_RE = re.compile(r"\{\{\s*range_id\s*\}\}")
+
+# --------------------------------------------------------------------------
+# Diff
+# --------------------------------------------------------------------------
+
+def fetch_applied_config():
+    """Return the config currently set on the Ludus range, or None."""
+    try:
+        out = get_range_config()
+    except LudusError:
+        return None
+    if not out:
+        return None
+    try:
+        config = yaml.safe_load(out)
+    except yaml.YAMLError:
+        return None
+    return config if isinstance(config, dict) and isinstance(config.get("ludus"), list) else None
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+def diff_configs(old, new):
+    """
+    Per-VM diff keyed by vm_name.
+
+    Returns {'added': [...], 'removed': [...], 'changed': {vm_name: [fields]},
+    'global': [top-level keys that differ]}.
+    """
+    old_vms = {vm.get("vm_name"): vm for vm in old.get("ludus") or []}
+    new_vms = {vm.get("vm_name"): vm for vm in new.get("ludus") or []}
+    changed = {}
+    for name in old_vms.keys() & new_vms.keys():
+        a, b = old_vms[name], new_vms[name]
+        fields = sorted(k for k in a.keys() | b.keys() if canonical(a.get(k)) != canonical(b.get(k)))
+        if fields:
+            changed[name] = fields
+    top_level = (old.keys() | new.keys()) - {"ludus"}
+    return {
+        "added": sorted(new_vms.keys() - old_vms.keys(), key=str),
+        "removed": sorted(old_vms.keys() - new_vms.keys(), key=str),
+        "changed": dict(sorted(changed.items(), key=lambda kv: str(kv[0]))),
+        "global": sorted(k for k in top_level if canonical(old.get(k)) != canonical(new.get(k))),
+    }
+
+def deploy_targets(config, diff):
+    """VM names to deploy: added/changed VMs and their depends_on dependents (None = everything)."""
+    if diff["global"]:
+        return None
+    roots = set(diff["added"]) | set(diff["changed"])
+    _, preds, _ = build_graph(config)
+    affected = dependents(preds, {(name, PROVISION) for name in roots})
+    return sorted({vm_name for vm_name, _ in affected}, key=str)
+
+def render_vm_name(name, range_id):
+    return RANGE_ID_RE.sub(range_id, name) if range_id else name
+
+def print_diff(diff, targets):
+    for name in diff["added"]:
+        print(f"  + {name}")
+    for name in diff["removed"]:
+        print(f"  - {name}")
+    for name, fields in diff["changed"].items():
+        print(f"  ~ {name} ({', '.join(fields)})")
+    for key in diff["global"]:
+        print(f"  ~ {key} (range-wide)")
+    if diff["removed"]:
+        print("  ⚠ removed VMs are not touched by a limited deploy; run a full deploy to tear them down")
+    if targets is None:
+        print("\nRange-wide settings changed: a full deploy is required.")
+    elif targets:
+        extra = len(targets) - len(diff["added"]) - len(diff["changed"])
+        print(f"\n{len(targets)} VM(s) to deploy ({extra} downstream dependent(s) included).")
+    else:
+        print("\nNo VM changes to deploy.")
+
+# --------------------------------------------------------------------------
+# Deploy
+# --------------------------------------------------------------------------
+
+def deploy_changes(config, config_path, range_id=None, previous=None, watch=True):
+    """
+    Diff `config` against the applied one, set it, and deploy only what changed.
+
+    Returns a process exit code (0 also when there is nothing to deploy).
+    """
+    if previous is None:
+        previous = fetch_applied_config()
+    if previous is None:
+        print("Error: could not read the currently applied range config (`ludus range config get`).", file=sys.stderr)
+        return 1
+    diff = diff_configs(previous, config)
+    targets = deploy_targets(config, diff)
+    print_diff(diff, targets)
+    if targets == []:
+        return 0
+
+    limit = None
+    if targets is not None:
+        names = [render_vm_name(name, range_id) for name in targets]
+        if any(RANGE_ID_RE.search(name) for name in names):
+            print("Error: vm_names use {{ range_id }}; pass the range ID to build the --limit list.", file=sys.stderr)
+            return 1
+        limit = "localhost," + ",".join(names)
+
+    if ludus("range", "config", "set", "-f", config_path) is None:
+        print(f"Error: `ludus range config set -f {config_path}` failed.", file=sys.stderr)
+        return 1
+    args = ["range", "deploy"] + (["--limit", limit] if limit else [])
+    print(f"Running: ludus {' '.join(args)}")
+    if ludus(*args) is None:
+        print("Error: `ludus range deploy` failed.", file=sys.stderr)
+        return 1
+    return watch_deployment() if watch else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff a range config against the applied one and deploy only what changed.")
+    parser.add_argument("config", help="New ludus range config (YAML)")
+    parser.add_argument("--previous", help="Previously applied config (default: `ludus range config get`)")
+    parser.add_argument("--range-id", help="Range ID used to render {{ range_id }} in vm_names for --limit")
+    parser.add_argument("--deploy", action="store_true", help="Set the config and run the limited deploy")
+    parser.add_argument("--no-watch", action="store_true", help="Don't watch the deploy after starting it")
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+        previous = load_config(args.previous) if args.previous else None
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    if args.deploy:
+        sys.exit(deploy_changes(config, args.config, args.range_id, previous, watch=not args.no_watch))
+
+    if previous is None:
+        previous = fetch_applied_config()
+        if previous is None:
+            print("Error: could not read the currently applied range config; pass --previous.", file=sys.stderr)
+            sys.exit(2)
+    diff = diff_configs(previous, config)
+    targets = deploy_targets(config, diff)
+    print_diff(diff, targets)
+    if targets:
+        print("--limit localhost," + ",".join(render_vm_name(name, args.range_id) for name in targets))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+range_snapshots.py
+
+Fast lab resets from snapshots instead of a full redeploy:
+- Groups the range's VMs into tiers by the forest role they run:
+    forest  - ludus_verify_dc_ready (parent DCs)
+    domains - ludus_create_child_domain / ludus_secondary_child_dc
+    joined  - ludus_prep_child_member / ludus_join_child_domain (members)
+- `take` snapshots every tier as <checkpoint>-<tier> (with RAM when the
+  config's defaults.snapshot_with_RAM is set)
+- `deploy` runs `ludus range deploy` and snapshots each tier as soon as the
+  deploy log shows its roles finished, before later tiers change its VMs
+- `restore` reverts the whole range, or one child domain, to a checkpoint
+  tier by tier in dependency order (DCs before the machines joined to them)
+
+Usage:
+    python3 range_snapshots.py take baseline ludus-config.yml --range-id MH
+    python3 range_snapshots.py deploy baseline ludus-config.yml --range-id MH
+    python3 range_snapshots.py restore baseline ludus-config.yml --range-id MH [--domain child1.parent.local] [--tier joined]
+    python3 range_snapshots.py list
+"""
+
+import re
+import sys
+import argparse
+
+import yaml
+
+from analyze_range import load_config, vm_roles, build_graph, topological_order
+from lint_range_config import vm_domain
+from ludus_client import LudusError, get_range_status
+from ludus_watch import ludus, watch_deployment
+from range_diff import render_vm_name
+
+# Tier name -> roles whose completion it captures, in dependency order.
+TIERS = [
+    ("forest", {"ludus_verify_dc_ready"}),
+    ("domains", {"ludus_create_child_domain", "ludus_secondary_child_dc"}),
+    ("joined", {"ludus_prep_child_member", "ludus_join_child_domain"}),
+]
+TIER_NAMES = [name for name, _ in TIERS]
+
+# Proxmox snapshot names: a letter, then letters, digits, '-' or '_'.
+CHECKPOINT_RE = re.compile(r"^[A-Za-z][A-Za-z0-9_-]{0,30}$")
+
+# --------------------------------------------------------------------------
+# Tiers
+# --------------------------------------------------------------------------
+
+def vm_tier(vm):
+    """Latest tier whose role this VM runs, or None for VMs outside the forest build."""
+    roles = {role for role, _ in vm_roles(vm)}
+    tier = None
+    for name, tier_roles in TIERS:
+        if roles & tier_roles:
+            tier = name
+    if tier is None:
+        # Domain machines Ludus sets up natively (e.g. the parent's alt-dc).
+        tier = {"primary-dc": "forest", "alt-dc": "forest", "member": "joined"}.get((vm.get("domain") or {}).get("role"))
+    return tier
+
+def plan_tiers(config, domain=None, tiers=None):
+    """{tier: [vm_name, ...]} in dependency order, optionally limited to one domain and some tiers."""
+    _, preds, _ = build_graph(config)
+    order = {}
+    for i, (vm_name, _) in enumerate(topological_order(preds)):
+        order.setdefault(vm_name, i)
+    plan = {name: [] for name in TIER_NAMES if not tiers or name in tiers}
+    for vm in config["ludus"]:
+        tier = vm_tier(vm)
+        if tier not in plan:
+            continue
+        if domain and (vm_domain(vm)[0] or "").lower() != domain.lower():
+            continue
+        plan[tier].append(vm["vm_name"])
+    for names in plan.values():
+        names.sort(key=lambda n: order.get(n, 0))
+    return {tier: names for tier, names in plan.items() if names}
+
+# --------------------------------------------------------------------------
+# Ludus
+# --------------------------------------------------------------------------
+
+def fetch_vm_ids():
+    """{vm name: proxmox id} for the current range, or None."""
+    try:
+        status = get_range_status()
+    except LudusError:
+        return None
+    return {vm.name: vm.proxmox_id for vm in status.vms}
+
+def resolve_ids(names, range_id, ids):
+    """Proxmox IDs for config vm_names; raises ValueError if a VM isn't in the range."""
+    resolved, missing = [], []
+    for name in names:
+        rendered = render_vm_name(name, range_id)
+        if ids.get(rendered) is None:
+            missing.append(rendered)
+        else:
+            resolved.append(str(ids[rendered]))
+    if missing:
+        raise ValueError(f"not deployed in this range: {', '.join(missing)}")
+    return resolved
+
+def run_tiers(action, checkpoint, plan, range_id, with_ram):
+    """Create or revert <checkpoint>-<tier> for each tier in order; returns an exit code."""
+    ids = fetch_vm_ids()
+    if ids is None:
+        print("Error: could not read the range's VMs from Ludus.", file=sys.stderr)
+        return 1
+    for tier, names in plan.items():
+        try:
+            vmids = ",".join(resolve_ids(names, range_id, ids))
+        except ValueError as e:
+            print(f"Error: {tier}: {e}", file=sys.stderr)
+            return 1
+        snapshot = f"{checkpoint}-{tier}"
+        if action == "take":
+            args = ["snapshot", "create", snapshot, "-n", vmids, "-d", f"{tier} tier ({len(names)} VMs)"]
+            if not with_ram:
+                args.append("--noRAM")
+        else:
+            args = ["snapshot", "revert", snapshot, "-n", vmids]
+        print(f"{'Snapshotting' if action == 'take' else 'Reverting'} {tier}: {len(names)} VM(s) -> {snapshot}")
+        if ludus(*args) is None:
+            print(f"Error: `ludus {' '.join(args)}` failed.", file=sys.stderr)
+            return 1
+        # Disk-only snapshots come back powered off; start the tier before the next one needs it.
+        # `power on -n` takes VM names, not the Proxmox IDs the snapshot commands use.
+        if action == "restore" and not with_ram:
+            vm_names = ",".join(render_vm_name(name, range_id) for name in names)
+            if ludus("power", "on", "-n", vm_names) is None:
+                print(f"Error: could not power on the {tier} tier.", file=sys.stderr)
+                return 1
+    return 0
+
+def take_checkpoint(config, checkpoint, range_id=None, domain=None, tiers=None):
+    plan = plan_tiers(config, domain, tiers)
+    if not plan:
+        print("Nothing to snapshot: no VM runs a forest build role.", file=sys.stderr)
+        return 1
+    with_ram = bool((config.get("defaults") or {}).get("snapshot_with_RAM", False))
+    return run_tiers("take", checkpoint, plan, range_id, with_ram)
+
+class TierCheckpointer:
+    """
+    Takes <checkpoint>-<tier> for each tier as the deploy finishes it.
+
+    Called with the DeployWatcher after every poll. A tier role has finished
+    once the watcher saw it end, or once anything ordered after it (the VM's
+    next role or a role that depends_on it) has started. Tiers that can't be
+    tracked that way (e.g. natively set up DCs) are taken by finish().
+    """
+
+    def __init__(self, config, checkpoint, range_id=None):
+        self.checkpoint, self.range_id = checkpoint, range_id
+        self.with_ram = bool((config.get("defaults") or {}).get("snapshot_with_RAM", False))
+        self.plan = plan_tiers(config)
+        self.code = 0
+        _, preds, _ = build_graph(config)
+        self.succs = {}
+        for node, before in preds.items():
+            for pred in before:
+                self.succs.setdefault(pred, set()).add(node)
+        tier_roles = dict(TIERS)
+        vms = {vm["vm_name"]: vm for vm in config["ludus"]}
+        self.nodes = {}
+        for tier, names in self.plan.items():
+            nodes = [(name, role) for name in names for role, _ in vm_roles(vms[name]) if role in tier_roles[tier]]
+            # Every VM of the tier needs a role to watch, or the tier waits for the deploy.
+            if {name for name, _ in nodes} == set(names):
+                self.nodes[tier] = nodes
+
+    def node_state(self, roles, node):
+        """'done', 'failed' or None (still running or not started) for a (vm_name, role) node."""
+        entry = roles.get(f"{render_vm_name(node[0], self.range_id)} {node[1]}")
+        if entry and entry["failed"]:
+            return "failed"
+        if entry and entry["end"] is not None:
+            return "done"
+        for name, role in self.succs.get(node, ()):
+            if f"{render_vm_name(name, self.range_id)} {role}" in roles:
+                return "done"
+        return None
+
+    def take(self, tier):
+        code = run_tiers("take", self.checkpoint, {tier: self.plan.pop(tier)}, self.range_id, self.with_ram)
+        self.code = self.code or code
+
+    def __call__(self, watcher):
+        roles = watcher.timeline["roles"]
+        for tier, nodes in self.nodes.items():
+            if tier in self.plan and all(self.node_state(roles, node) == "done" for node in nodes):
+                self.take(tier)
+
+    def finish(self):
+        """Take the tiers still pending once the deploy succeeded; returns an exit code."""
+        for tier in list(self.plan):
+            self.take(tier)
+        return self.code
+
+def deploy_with_checkpoint(config, checkpoint, range_id=None):
+    """Deploy the range, snapshotting each tier as it completes; returns an exit code."""
+    checkpointer = TierCheckpointer(config, checkpoint, range_id)
+    if not checkpointer.plan:
+        print("Nothing to snapshot: no VM runs a forest build role.", file=sys.stderr)
+        return 1
+    if ludus("range", "deploy") is None:
+        print("Error: `ludus range deploy` failed.", file=sys.stderr)
+        return 1
+    code = watch_deployment(on_poll=checkpointer)
+    if code != 0:
+        if checkpointer.code == 0 and len(checkpointer.plan) < len(TIER_NAMES):
+            print("Deploy did not succeed; only the finished tiers were snapshotted.", file=sys.stderr)
+        return code
+    return checkpointer.finish()
+
+def restore_checkpoint(config, checkpoint, range_id=None, domain=None, tiers=None):
+    plan = plan_tiers(config, domain, tiers)
+    if not plan:
+        print("Nothing to restore for that selection.", file=sys.stderr)
+        return 1
+    with_ram = bool((config.get("defaults") or {}).get("snapshot_with_RAM", False))
+    return run_tiers("restore", checkpoint, plan, range_id, with_ram)
+
+# --------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiered snapshot checkpoints for a forest range.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command, verb in (("take", "Snapshot"), ("restore", "Revert")):
+        p = sub.add_parser(command, help=f"{verb} every tier of a checkpoint")
+        p.add_argument("checkpoint", help="Checkpoint name, e.g. baseline")
+        p.add_argument("config", help="The range's ludus config (YAML)")
+        p.add_argument("--range-id", help="Range ID used to render {{ range_id }} in vm_names")
+        p.add_argument("--domain", help="Only VMs of this domain, e.g. child1.parent.local")
+        p.add_argument("--tier", action="append", choices=TIER_NAMES, help="Only this tier (repeatable)")
+    p = sub.add_parser("deploy", help="Run `ludus range deploy` and snapshot each tier as it completes")
+    p.add_argument("checkpoint", help="Checkpoint name, e.g. baseline")
+    p.add_argument("config", help="The range's ludus config, already set with `ludus range config set`")
+    p.add_argument("--range-id", help="Range ID used to render {{ range_id }} in vm_names")
+    sub.add_parser("list", help="List the range's snapshots")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        out = ludus("snapshot", "list")
+        if out is None:
+            print("Error: `ludus snapshot list` failed.", file=sys.stderr)
+            sys.exit(1)
+        print(out, end="")
+        return
+
+    if not CHECKPOINT_RE.match(args.checkpoint):
+        print("Error: checkpoint names start with a letter and use only letters, digits, '-' and '_'.", file=sys.stderr)
+        sys.exit(2)
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.command == "deploy":
+        sys.exit(deploy_with_checkpoint(config, args.checkpoint, args.range_id))
+    action = take_checkpoint if args.command == "take" else restore_checkpoint
+    sys.exit(action(config, args.checkpoint, args.range_id, args.domain, args.tier))
+
+if __name__ == "__main__":
+    main()
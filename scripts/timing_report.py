@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+timing_report.py
+
+Summarizes the JSON Lines written by callback_plugins/ludus_forest_timing.py:
+- p50/p95/max duration per role task, across every recorded run
+- Retry and failure counts per task
+- Per-role totals (one sample per host per run)
+- Replica DC promotions split by mode (IFM vs network replication), so the
+  ludus_secondary_child_dc IFM option can be compared against the default
+
+Usage:
+    python3 timing_report.py [~/.ansible/ludus_forest_timing.jsonl ...] [--role ludus_join_child_domain] [--json]
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from collections import defaultdict
+
+DEFAULT_LOG = os.path.expanduser("~/.ansible/ludus_forest_timing.jsonl")
+
+REPLICA_ROLE = "ludus_secondary_child_dc"
+PROMOTE_TASK = "Promote this server to a replica Domain Controller"
+
+def load_records(paths):
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        print(f"⚠ skipping malformed line in {path}", file=sys.stderr)
+    return records
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50": round(percentile(samples, 50), 1),
+        "p95": round(percentile(samples, 95), 1),
+        "max": round(max(samples), 1),
+    }
+
+def replica_promotions(records):
+    """{mode: {'total': ..., 'promote': ...}} for replica DC builds, one sample per host per run."""
+    builds = defaultdict(lambda: {"ifm": False, "total": 0.0, "promote": 0.0})
+    for r in records:
+        if r.get("role") != REPLICA_ROLE or r.get("status") == "skipped":
+            continue
+        build = builds[(r.get("run_id"), r.get("host"))]
+        task = str(r.get("task"))
+        build["total"] += r.get("duration", 0)
+        build["ifm"] |= "IFM" in task
+        if task.startswith(PROMOTE_TASK):
+            build["promote"] += r.get("duration", 0)
+    modes = defaultdict(lambda: {"total": [], "promote": []})
+    for build in builds.values():
+        # Re-runs that took the already-a-DC fast path never promoted.
+        if not build["promote"]:
+            continue
+        mode = modes["ifm" if build["ifm"] else "network"]
+        mode["total"].append(build["total"])
+        mode["promote"].append(build["promote"])
+    return {mode: {"total": summarize(m["total"]), "promote": summarize(m["promote"])}
+            for mode, m in sorted(modes.items())}
+
+def build_report(records):
+    tasks = defaultdict(lambda: {"durations": [], "retries": 0, "failed": 0})
+    role_totals = defaultdict(float)
+    runs = set()
+    for r in records:
+        if r.get("status") == "skipped":
+            continue
+        runs.add(r.get("run_id"))
+        entry = tasks[(r.get("role"), r.get("task"))]
+        entry["durations"].append(r.get("duration", 0))
+        entry["retries"] += r.get("retries", 0)
+        entry["failed"] += r.get("status") in ("failed", "unreachable")
+        role_totals[(r.get("role"), r.get("run_id"), r.get("host"))] += r.get("duration", 0)
+
+    per_role = defaultdict(list)
+    for (role, _, _), total in role_totals.items():
+        per_role[role].append(total)
+
+    return {
+        "runs": len(runs),
+        "records": len(records),
+        "roles": {role: summarize(totals) for role, totals in sorted(per_role.items(), key=lambda kv: str(kv[0]))},
+        "tasks": sorted(({"role": role, "task": task, "retries": e["retries"], "failed": e["failed"],
+                          **summarize(e["durations"])}
+                         for (role, task), e in tasks.items()),
+                        key=lambda t: t["p95"], reverse=True),
+        "replica_promotion": replica_promotions(records),
+    }
+
+def print_report(report):
+    print(f"{report['records']} records from {report['runs']} run(s)\n")
+    print(f"{'ROLE (per host, per run)':<48} {'N':>4} {'p50':>8} {'p95':>8} {'max':>8}")
+    for role, s in report["roles"].items():
+        print(f"{str(role):<48} {s['count']:>4} {s['p50']:>7}s {s['p95']:>7}s {s['max']:>7}s")
+    print(f"\n{'TASK':<48} {'N':>4} {'p50':>8} {'p95':>8} {'max':>8} {'retry':>6} {'fail':>5}")
+    for t in report["tasks"]:
+        name = f"{t['role']} : {t['task']}"
+        if len(name) > 48:
+            name = name[:45] + "..."
+        print(f"{name:<48} {t['count']:>4} {t['p50']:>7}s {t['p95']:>7}s {t['max']:>7}s {t['retries']:>6} {t['failed']:>5}")
+    if report["replica_promotion"]:
+        print(f"\n{'REPLICA DC BUILD (per host, per run)':<48} {'N':>4} {'p50':>8} {'p95':>8} {'max':>8}")
+        for mode, m in report["replica_promotion"].items():
+            for part in ("total", "promote"):
+                s = m[part]
+                print(f"{mode + ' : ' + part:<48} {s['count']:>4} {s['p50']:>7}s {s['p95']:>7}s {s['max']:>7}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate ludus_forest_timing callback records.")
+    parser.add_argument("logs", nargs="*", default=[DEFAULT_LOG], help=f"JSON Lines files (default: {DEFAULT_LOG})")
+    parser.add_argument("--role", action="append", help="Only include this role (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        records = load_records(args.logs)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.role:
+        records = [r for r in records if r.get("role") in args.role]
+    if not records:
+        print("No timing records found.", file=sys.stderr)
+        sys.exit(1)
+
+    report = build_report(records)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()